@@ -0,0 +1,125 @@
+"""Compare the speed of the float, integer-cent and plain Decimal mortgage schedules."""
+
+from argparse import ArgumentParser
+from decimal import Decimal
+import random
+import sys
+import time
+
+import mortgage
+
+
+def decimal_schedule(balance, interest_rate, target_payment, payments_per_year = 12):
+    """Yields a schedule with ordinary Decimal arithmetic, as a baseline.
+
+    Every operation uses the current thread's context and every interest
+    amount is quantized on its own, which is what a straightforward Decimal
+    port of amortization_schedule would do. Each period is yielded as a
+    SchedulePeriod, like the float and integer-cent schedules, so the
+    benchmark times the same work on every path.
+
+    Args:
+        balance (Decimal): the balance in dollars.
+        interest_rate (Decimal): annual interest rate, between 0 and 1.
+        target_payment (Decimal): the amount paid each period, in dollars.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+
+    Yields:
+        SchedulePeriod: the period, payment, interest, principal and balance.
+    """
+    r = interest_rate / payments_per_year
+    period = 0
+    while balance > 0:
+        period += 1
+        interest = (balance * r).quantize(mortgage.CENT)
+        payment = min(target_payment, balance + interest)
+        principal = payment - interest
+        balance -= principal
+        yield mortgage.SchedulePeriod(period, payment, interest, principal, balance)
+
+
+def make_loans(count, seed = 0):
+    """Makes random loans as (principal, rate, payment) in dollars.
+
+    Args:
+        count (int): the number of loans.
+        seed (int, optional): the random seed. Defaults to 0.
+
+    Returns:
+        list of tuple: (principal, annual rate string, minimum payment) per loan.
+    """
+    rng = random.Random(seed)
+    loans = []
+    for _ in range(count):
+        principal = rng.randrange(50_000, 1_000_000)
+        rate = f"0.0{rng.randrange(200, 900)}"
+        payment = mortgage.min_payment_cents(principal, rate) / 100
+        loans.append((principal, rate, payment))
+    return loans
+
+
+def bench(name, function, loans):
+    """Times one schedule implementation over every loan.
+
+    Every row of every schedule is consumed the same way, so the timings
+    differ only in the arithmetic.
+
+    Args:
+        name (str): a label for the output.
+        function (callable): takes (principal, rate, payment) and returns a
+            schedule generator.
+        loans (list of tuple): the loans from make_loans.
+
+    Returns:
+        float: the number of seconds taken.
+
+    Side effects:
+        Writes the timing to stdout.
+    """
+    start = time.perf_counter()
+    for loan in loans:
+        for _ in function(*loan):
+            pass
+    seconds = time.perf_counter() - start
+    print(f"{name:<16}{seconds:8.3f} s")
+    return seconds
+
+
+def main(count):
+    """Benchmarks every schedule implementation on count random loans.
+
+    Args:
+        count (int): the number of loans.
+
+    Side effects:
+        Writes the timings and their ratios to the float path to stdout.
+    """
+    loans = make_loans(count)
+    float_time = bench("float", lambda p, i, t: mortgage.amortization_schedule(
+        p, float(i), t), loans)
+    cents_time = bench("integer cents", lambda p, i, t: mortgage.amortization_schedule_cents(
+        p * 100, i, round(t * 100)), loans)
+    decimal_time = bench("plain Decimal", lambda p, i, t: decimal_schedule(
+        Decimal(p), Decimal(i), Decimal(str(t))), loans)
+    print(f"integer cents / float: {cents_time / float_time:.2f}x")
+    print(f"plain Decimal / float: {decimal_time / float_time:.2f}x")
+
+
+def parse_args(arglist):
+    """Parse command-line arguments.
+
+    Args:
+        arglist (list of str): command-line arguments.
+
+    Returns:
+        namespace: an object with a loans attribute (int).
+    """
+    parser = ArgumentParser()
+    parser.add_argument("-l", "--loans", type=int, default=1000,
+                        help="number of random loans to time (default: 1000)")
+    return parser.parse_args(arglist)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    main(args.loans)
@@ -1,7 +1,13 @@
 #Erin Keane 
 """Determines if two people are related through a model of family relationships."""
 from argparse import ArgumentParser
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 import json 
+import mmap
+import re
+import struct
 import sys 
 import relationships
 
@@ -28,30 +34,55 @@ class Person():
         self.gender = gender 
         self.parents = []
         self.spouse = None 
+        self.family = None
         
     def add_parent(self, parent):
         """Adds a parent to the attribute
         
             Side effects: 
-                Modifies the self.parents by adding to the list.
+                Modifies the self.parents by adding to the list, and records the 
+                change with the family so the cached connections that reach this 
+                person are dropped.
         """
         self.parents.append(parent)
+        if self.family is not None: 
+            self.family.record_change("parent", self, parent)
         
     def set_spouse(self, spouse):
         """Adds a spouse to the attribute.
+        
+            Side effects: 
+                Sets self.spouse, and records the change with the family so 
+                the cached connections that reach this person are dropped.
         """
         self.spouse = spouse
+        if self.family is not None: 
+            self.family.record_change("spouse", self, spouse)
          
     def connections(self): 
         """ Identify connections between possible relatives
+        
+        If the person belongs to a Family, the map is cached by the family and 
+        shared between calls, so it must not be modified.
 
         Returns:
             dict: a dictionary 
         """
+        if self.family is not None: 
+            return self.family.connections(self)
+        return self.build_connections()
+    
+    def build_connections(self): 
+        """ Walk the tree breadth first to find every ancestor and spouse of an ancestor.
+
+        Returns:
+            dict: each reachable Person mapped to the path taken to reach them, 
+            "P" for each step to a parent and "S" for the step to a spouse.
+        """
         cdict = {self: ''} 
-        queue = [self]
+        queue = deque([self])
         while queue: 
-            person = queue.pop(0) 
+            person = queue.popleft() 
             personpath = cdict[person]
             
             for parent in person.parents: 
@@ -75,27 +106,46 @@ class Person():
         Returns:
             str: describes the relationship between the two individuals.
         """
-        person_dict = person.connections() 
-        self_dict = self.connections() 
-        combined_paths = set(self_dict).intersection(set(person_dict))
-        
-        if not combined_paths: 
-            return None 
-        else: 
-           lcr = min(combined_paths, key = lambda p: len(f"{self_dict[p]} : {person_dict[p]}"))
-           lcr_path = f"{self_dict[lcr]}:{person_dict[lcr]}"
-           if lcr_path in relationships.relationships: 
-               return relationships.relationships[lcr_path][self.gender]
-           else: 
-               return 'distant relative' 
+        return relation_from_connections(self.connections(), person.connections(), self.gender)
+
+
+def relation_from_connections(self_dict, person_dict, gender): 
+    """Names a relationship from the connection maps of two people.
+
+    Args:
+        self_dict (dict): the connection map of the first person.
+        person_dict (dict): the connection map of the second person.
+        gender (str): the first person's gender.
+
+    Returns:
+        None or str: the kinship term for the first person, 'distant relative' 
+        if the shortest shared path has no term, or None if nobody is shared.
+    """
+    combined_paths = set(self_dict).intersection(set(person_dict))
+    
+    if not combined_paths: 
+        return None 
+    else: 
+       lcr = min(combined_paths, key = lambda p: len(f"{self_dict[p]} : {person_dict[p]}"))
+       lcr_path = f"{self_dict[lcr]}:{person_dict[lcr]}"
+       if lcr_path in relationships.relationships: 
+           return relationships.relationships[lcr_path][gender]
+       else: 
+           return 'distant relative' 
            
 class Family(): 
     """ Keeps track of the Person instances, each instance is a person.
     
     Attributes: 
         people (dict): each key is the name of a person and the value is a corresponding Person object.
+        cache_size (int): how many connection maps are kept.
+        version (int): the number of changes made since the family was built.
+        changes (list of tuple): the change log, one (version, kind, names) 
+            entry per change, where kind is "person", "parent" or "spouse". 
+            Only the latest changes are kept.
+        max_changes (int): the most entries kept in the change log.
     """
-    def __init__(self, familydict):
+    def __init__(self, familydict, cache_size = 1024, max_changes = 10_000):
         """_summary_
 
         Args:
@@ -103,11 +153,20 @@ class Family():
             individuals (dict) - Persons name and their gender.
             parents (dict) - Persons name and their parents.
             couples (list of str) - Contains a married couple of two names.
+            cache_size (int, optional): how many connection maps to keep. 
+                Defaults to 1024.
+            max_changes (int, optional): how many change log entries to 
+                keep. Defaults to 10,000.
             
         Side Effects: 
             Sets the people attribute, modifies the spouse and parent attribute.
         """
         self.people = {} 
+        self.cache_size = cache_size
+        self.max_changes = max_changes
+        self._connections = OrderedDict()
+        self.version = 0
+        self.changes = []
         
         for individual in familydict ['individuals']: 
             other_person = Person(individual, familydict['individuals'] [individual])
@@ -124,6 +183,142 @@ class Family():
             person2 = self.people[couple[1]]
             person1.set_spouse(person2)
             person2.set_spouse(person1)
+        
+        # joined last, so building the tree does not fill the change log
+        for person in self.people.values(): 
+            person.family = self
+    
+    def add_person(self, name, gender): 
+        """Adds a new individual with no parents or spouse.
+
+        Args:
+            name (str): the new person's name.
+            gender (str): the new person's gender.
+
+        Returns:
+            Person: the new person.
+            
+        Raises:
+            ValueError: someone with that name is already in the family.
+            
+        Side effects: 
+            Adds to people and the change log.
+        """
+        if name in self.people: 
+            raise ValueError(f"{name} is already in the family")
+        person = Person(name, gender)
+        person.family = self
+        self.people[name] = person
+        self._log("person", (name,))
+        return person
+    
+    def add_parent(self, name, parent): 
+        """Records that one person is a parent of another.
+
+        Args:
+            name (str): the child's name.
+            parent (str): the parent's name.
+            
+        Side effects: 
+            Updates the child, the change log and the cached connections.
+        """
+        self.people[name].add_parent(self.people[parent])
+    
+    def add_couple(self, name1, name2): 
+        """Records that two people are married.
+
+        Args:
+            name1 (str): the first spouse's name.
+            name2 (str): the second spouse's name.
+            
+        Side effects: 
+            Updates both people, the change log and the cached connections.
+        """
+        person1 = self.people[name1]
+        person2 = self.people[name2]
+        person1.set_spouse(person2)
+        person2.set_spouse(person1)
+    
+    def record_change(self, kind, person, other): 
+        """Logs a change to the tree and drops the cached maps it affects.
+        
+        Only the connection maps that already reach the changed person can 
+        be affected by a new link from that person, so only those are dropped.
+
+        Args:
+            kind (str): "parent" or "spouse".
+            person (Person): the person whose parents or spouse changed.
+            other (Person): the new parent or spouse.
+            
+        Side effects: 
+            Adds to the change log and drops cached connection maps.
+        """
+        self._log(kind, (person.name, other.name))
+        self.invalidate(person)
+    
+    def _log(self, kind, names): 
+        """Adds an entry to the change log, dropping the oldest past max_changes."""
+        self.version += 1
+        self.changes.append((self.version, kind, names))
+        if len(self.changes) > self.max_changes: 
+            # down to half the cap, so the list is shifted once per 
+            # max_changes // 2 changes rather than on every change
+            del self.changes[:len(self.changes) - self.max_changes // 2]
+    
+    def changes_since(self, version): 
+        """Returns the change log entries made after a version.
+
+        Args:
+            version (int): a version seen earlier.
+
+        Returns:
+            list of tuple or None: the (version, kind, names) entries, oldest 
+            first, or None if some of them have already been dropped from 
+            the log.
+        """
+        # the log holds the latest versions, one entry each
+        first = self.version - len(self.changes)
+        if version < first: 
+            return None
+        return self.changes[version - first:]
+            
+    def connections(self, person): 
+        """Returns the connection map of a person, building it on first use.
+
+        Maps are kept in a least-recently-used cache of cache_size entries 
+        and must not be modified.
+
+        Args:
+            person (Person): a person in the family.
+
+        Returns:
+            dict: the cached result of person.build_connections().
+        """
+        cdict = self._connections.get(person)
+        if cdict is not None: 
+            self._connections.move_to_end(person)
+            return cdict
+        cdict = self._connections[person] = person.build_connections()
+        if len(self._connections) > self.cache_size: 
+            self._connections.popitem(last = False)
+        return cdict
+    
+    def invalidate(self, person = None): 
+        """Forgets cached connection maps after the tree changes.
+
+        Args:
+            person (Person, optional): the person whose links changed; only 
+                the maps that reach them are dropped. Defaults to None, which 
+                drops every map.
+        
+        Side effects: 
+            Removes entries from the cache of connection maps.
+        """
+        if person is None: 
+            self._connections.clear()
+            return
+        for key in [key for key, cdict in self._connections.items() if person in cdict]: 
+            del self._connections[key]
             
     def relation(self, name1, name2): 
         """Returns the determined relationship between two individuals.
@@ -141,25 +336,1006 @@ class Family():
         return name1_object.relation_to(name2_object)
     
         
-def main(filepath, name1, name2): 
-    """Finalizes the relationship between two individuals using the specified file.
+class AncestryIndex(): 
+    """ A precomputed index that answers Family.relation queries quickly.
+    
+    A general lowest-common-ancestor structure does not fit a tree where 
+    everyone has two parents and paths can hop to a spouse, so the index 
+    keeps two small labels per person instead:
+    
+    - a near map: the first depth steps of the person's connection map, which 
+      is exactly the start of the breadth-first walk in build_connections. 
+      depth is the length of the longest path in the relationships table, so 
+      if two people share anyone at all within depth steps in total, the 
+      shortest shared path is in both near maps and the answer is read off 
+      directly, and otherwise their answer is 'distant relative' or None.
+    - a component: everyone joined to the person by any chain of parent and 
+      spouse links, kept as a union-find forest. A connection map only 
+      follows those links, so two people in different components are 
+      answered with None. Links are only ever added, so components only 
+      merge and the forest is updated in place.
+    
+    People in the same component whose near maps meet beyond depth steps 
+    are answered with 'distant relative'. Only pairs that meet within depth 
+    steps, or sit in different components, are answered from the labels 
+    alone; the rest need to know whether the two connection maps meet at 
+    all, which can take a walk over the whole component. 
+    
+    To bound that, the index keeps a set of meeting points: everyone without 
+    parents, plus enough people on loops of parent links that every loop 
+    has one. A connection map holds all the ancestors of everyone in it, so 
+    if two maps share anyone they share that person's ancestors, and with 
+    them a meeting point. Each person's meeting points are found with one 
+    walk of their connection map and kept in a least-recently-used cache of 
+    cache_size entries, so later queries for them only intersect two sets. 
+    Any change to the family clears the cache.
+    
+    Attributes: 
+        family (Family): the indexed family.
+        depth (int): how many steps the near maps cover.
+        near (dict): each Person mapped to their near map.
+        version (int): the family version the labels were last brought up to.
+        cache_size (int): how many people's meeting points are kept.
+    """
+    def __init__(self, family, cache_size = 1024):
+        """Builds the labels for everyone in a family.
+
+        Args:
+            family (Family): the family to index.
+            cache_size (int, optional): how many people's meeting points to 
+                keep. Defaults to 1024.
+            
+        Side Effects: 
+            Sets the family, depth and cache_size attributes and builds the 
+            labels.
+        """
+        self.family = family
+        self.depth = max((len(path) - 1 for path in relationships.relationships), default = 0)
+        self.cache_size = cache_size
+        self.rebuild()
+    
+    def rebuild(self): 
+        """Recomputes every label from the family.
+        
+        Side Effects: 
+            Replaces the components, near maps and meeting points.
+        """
+        people = list(self.family.people.values())
+        self.version = self.family.version
+        self._meeting_points = self.find_meeting_points(people)
+        self._met = OrderedDict()
+        self._components = {person: person for person in people}
+        for person in people: 
+            for parent in person.parents: 
+                self._join(person, parent)
+            if person.spouse is not None: 
+                self._join(person, person.spouse)
+        self.near = {person: self.near_connections(person) for person in people}
+        self._reached_by = {person: set() for person in people}
+        for person, cdict in self.near.items(): 
+            for relative in cdict: 
+                self._reached_by[relative].add(person)
+    
+    def _component(self, person): 
+        """Returns the person standing for someone's component."""
+        components = self._components
+        while components[person] is not person: 
+            # point everyone passed at their grandparent, halving the path
+            components[person] = person = components[components[person]]
+        return person
+    
+    def _join(self, person1, person2): 
+        """Merges the components of two linked people."""
+        self._components[self._component(person1)] = self._component(person2)
+    
+    def refresh(self): 
+        """Applies the family's changes since the labels were last built.
+        
+        A new parent or spouse link only changes the near maps that already 
+        reach the person it was added to, so only those are recomputed, and 
+        joins the components of the two people it links. Replacing an 
+        existing spouse, or falling so far behind that the family has 
+        dropped some of the changes from its log, falls back to a full 
+        rebuild.
+        
+        A new person or parent is made a meeting point, as any loop the link 
+        closes passes through the parent, and the cached meeting points of 
+        each person are dropped.
+        
+        Side Effects: 
+            Updates the components, near maps, meeting points and version.
+        """
+        changes = self.family.changes_since(self.version)
+        if changes is None: 
+            self.rebuild()
+            return
+        if not changes: 
+            return
+        people = self.family.people
+        stale = set()
+        self._met.clear()
+        for version, kind, names in changes: 
+            if kind != "spouse": 
+                self._meeting_points.add(people[names[-1]])
+            if kind == "person": 
+                person = people[names[0]]
+                self._components[person] = person
+                self.near[person] = {person: ''}
+                self._reached_by[person] = {person}
+                continue
+            person, relative = people[names[0]], people[names[1]]
+            if kind == "spouse" and any(path == "S" and other is not relative 
+                                        for other, path in self.near[person].items()): 
+                self.rebuild()
+                return
+            self._join(person, relative)
+            stale |= self._reached_by[person]
+        for person in stale: 
+            for relative in self.near[person]: 
+                self._reached_by[relative].discard(person)
+            self.near[person] = self.near_connections(person)
+            for relative in self.near[person]: 
+                self._reached_by[relative].add(person)
+        self.version = self.family.version
+    
+    def near_connections(self, start): 
+        """Walks build_connections' breadth-first search only depth steps out.
+
+        Args:
+            start (Person): the person to start from.
+
+        Returns:
+            dict: every person within depth steps mapped to the same path 
+            build_connections gives them.
+        """
+        cdict = {start: ''} 
+        queue = deque([start])
+        while queue: 
+            person = queue.popleft() 
+            personpath = cdict[person]
+            if len(personpath) == self.depth: 
+                continue
+            
+            for parent in person.parents: 
+                if parent not in cdict: 
+                    cdict[parent] = personpath + "P"
+                    queue.append(parent)
+                    
+            if 'S' not in personpath and person.spouse and person.spouse not in cdict: 
+                cdict[person.spouse] = personpath + "S"
+                queue.append(person.spouse)
+        return cdict
+    
+    @staticmethod
+    def find_meeting_points(people): 
+        """Picks the people that every set of connected ancestors includes.
+        
+        Everyone without parents is picked, and a depth-first walk up the 
+        parent links picks the parent at the end of every link that closes 
+        a loop, so every loop has a pick on it.
+
+        Args:
+            people (list of Person): everyone in the family.
+
+        Returns:
+            set of Person: the meeting points.
+        """
+        points = {person for person in people if not person.parents}
+        done = set()
+        for start in people: 
+            if start in done: 
+                continue
+            on_path = {start}
+            stack = [(start, iter(start.parents))]
+            while stack: 
+                person, parents = stack[-1]
+                parent = next(parents, None)
+                if parent is None: 
+                    stack.pop()
+                    on_path.discard(person)
+                    done.add(person)
+                elif parent in on_path: 
+                    points.add(parent)
+                elif parent not in done: 
+                    on_path.add(parent)
+                    stack.append((parent, iter(parent.parents)))
+        return points
+    
+    def meeting_points(self, start): 
+        """Returns the meeting points in a person's connection map.
+        
+        The walk is build_connections' breadth-first search without the 
+        paths, only noting whether a spouse step was taken.
+
+        Args:
+            start (Person): the person to start from.
+
+        Returns:
+            frozenset of Person: the meeting points the person reaches.
+        """
+        met = self._met.get(start)
+        if met is not None: 
+            self._met.move_to_end(start)
+            return met
+        spoused = {start: False}
+        queue = deque([start])
+        while queue: 
+            person = queue.popleft()
+            after_spouse = spoused[person]
+            for parent in person.parents: 
+                if parent not in spoused: 
+                    spoused[parent] = after_spouse
+                    queue.append(parent)
+            spouse = person.spouse
+            if not after_spouse and spouse and spouse not in spoused: 
+                spoused[spouse] = True
+                queue.append(spouse)
+        met = self._met[start] = frozenset(self._meeting_points.intersection(spoused))
+        if len(self._met) > self.cache_size: 
+            self._met.popitem(last = False)
+        return met
+    
+    def relation(self, name1, name2): 
+        """Returns the same relationship as Family.relation.
+
+        Args:
+            name1 (str): Name of a person in the family tree 
+            name2 (str): Name of a second person in the family tree
+
+        Returns:
+            None or str: a kindship term
+        """
+        self.refresh()
+        person1 = self.family.people[name1]
+        person2 = self.family.people[name2]
+        near1 = self.near[person1]
+        near2 = self.near[person2]
+        shared = [len(near1[p]) + len(near2[p]) for p in near1.keys() & near2.keys()]
+        if shared and min(shared) <= self.depth: 
+            return relation_from_connections(near1, near2, person1.gender)
+        if self._component(person1) is not self._component(person2): 
+            return None
+        if shared or not self.meeting_points(person1).isdisjoint(self.meeting_points(person2)): 
+            return 'distant relative'
+        return None
+
+
+class CompactFamily(): 
+    """ A memory-compact family tree for very large datasets.
+    
+    Instead of one Person object per individual, everyone gets a dense integer 
+    id. Parent links are stored CSR style: the parents of id i are 
+    parent_ids[parent_offsets[i]:parent_offsets[i + 1]]. Spouses are an array 
+    of ids (-1 for none) and genders are small codes into a list of gender 
+    names. Person objects are only made when asked for, and relation works 
+    exactly like Family.relation.
+    
+    Attributes: 
+        names (list of str): the name of each id.
+        ids (dict): each name mapped to its id.
+        genders (bytearray): the gender code of each id.
+        gender_names (list of str): the gender for each code.
+        parent_offsets (array): where each id's parents start in parent_ids.
+        parent_ids (array): the parent ids of everyone, grouped by child.
+        spouses (array): the spouse id of each id, or -1.
+    """
+    def __init__(self, familydict, cache_size = 1024):
+        """Builds the compact arrays from a family dictionary.
+
+        Args:
+            familydict (dict): the same dictionary Family takes.
+            cache_size (int, optional): how many connection maps to keep. 
+                Defaults to 1024.
+            
+        Side Effects: 
+            Sets the array attributes.
+        """
+        self.names = list(familydict['individuals'])
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.gender_names = []
+        gender_codes = {}
+        self.genders = bytearray()
+        for name in self.names: 
+            gender = familydict['individuals'][name]
+            if gender not in gender_codes: 
+                gender_codes[gender] = len(self.gender_names)
+                self.gender_names.append(gender)
+            self.genders.append(gender_codes[gender])
+        
+        self.parent_offsets = array('I', [0])
+        self.parent_ids = array('I')
+        parents = familydict['parents']
+        for name in self.names: 
+            self.parent_ids.extend(self.ids[parent] for parent in parents.get(name, ()))
+            self.parent_offsets.append(len(self.parent_ids))
+        
+        self.spouses = array('i', [-1]) * len(self.names)
+        for name1, name2 in familydict['couples']: 
+            self.spouses[self.ids[name1]] = self.ids[name2]
+            self.spouses[self.ids[name2]] = self.ids[name1]
+        
+        self.cache_size = cache_size
+        self._connections = OrderedDict()
+    
+    @classmethod
+    def from_records(cls, records, cache_size = 1024): 
+        """Builds the compact arrays straight from iter_family_file records.
+        
+        No Person objects or family dictionary are made along the way. Names 
+        get an id when they are first mentioned, so parent and couple records 
+        can come before the people they name, and the ids are put back in 
+        the order of the individuals records at the end. Couples are applied 
+        in file order, as Family does.
+
+        Args:
+            records (iterable of tuple): records from iter_family_file.
+            cache_size (int, optional): how many connection maps to keep. 
+                Defaults to 1024.
+
+        Returns:
+            CompactFamily: the same family CompactFamily(json.load(f)) would build.
+            
+        Raises:
+            KeyError: a parent or couple record names someone who is not in 
+                the individuals.
+        """
+        ids = {}
+        names = []
+        genders = bytearray()
+        gender_codes = {}
+        gender_names = []
+        order = array('I')
+        children = array('I')
+        parents = array('I')
+        couples = array('I')
+        
+        def id_of(name): 
+            i = ids.get(name)
+            if i is None: 
+                i = ids[name] = len(names)
+                names.append(name)
+                genders.append(NO_GENDER)
+            return i
+        
+        for kind, name, value in records: 
+            if kind == "individual": 
+                i = id_of(name)
+                if genders[i] == NO_GENDER: 
+                    order.append(i)
+                if value not in gender_codes: 
+                    gender_codes[value] = len(gender_names)
+                    gender_names.append(value)
+                genders[i] = gender_codes[value]
+            elif kind == "parents": 
+                i = id_of(name)
+                for parent in value: 
+                    children.append(i)
+                    parents.append(id_of(parent))
+            else: 
+                couples.append(id_of(name))
+                couples.append(id_of(value))
+        if len(order) != len(names): 
+            raise KeyError(next(name for name, i in ids.items() if genders[i] == NO_GENDER))
+        
+        n = len(names)
+        new_id = array('I', [0]) * n
+        for k, i in enumerate(order): 
+            new_id[i] = k
+        
+        family = cls.__new__(cls)
+        family.names = [names[i] for i in order]
+        for k, name in enumerate(family.names): 
+            ids[name] = k
+        family.ids = ids
+        family.genders = bytearray(genders[i] for i in order)
+        family.gender_names = gender_names
+        
+        family.parent_offsets = array('I', [0]) * (n + 1)
+        for child in children: 
+            family.parent_offsets[new_id[child] + 1] += 1
+        for k in range(n): 
+            family.parent_offsets[k + 1] += family.parent_offsets[k]
+        family.parent_ids = array('I', [0]) * len(parents)
+        cursor = family.parent_offsets[:-1]
+        for child, parent in zip(children, parents): 
+            child = new_id[child]
+            family.parent_ids[cursor[child]] = new_id[parent]
+            cursor[child] += 1
+        
+        family.spouses = array('i', [-1]) * n
+        for k in range(0, len(couples), 2): 
+            person1, person2 = new_id[couples[k]], new_id[couples[k + 1]]
+            family.spouses[person1] = person2
+            family.spouses[person2] = person1
+        
+        family.cache_size = cache_size
+        family._connections = OrderedDict()
+        return family
+    
+    @classmethod
+    def from_snapshot(cls, filepath, cache_size = 1024): 
+        """Opens a snapshot written by write_snapshot without copying it.
+        
+        The arrays are memory-mapped views of the file, and names are decoded 
+        only when they are looked up, so opening takes about the same time 
+        for any size of family.
+
+        Args:
+            filepath (str): The path to the snapshot file.
+            cache_size (int, optional): how many connection maps to keep. 
+                Defaults to 1024.
+
+        Returns:
+            CompactFamily: the family stored in the snapshot.
+            
+        Raises:
+            ValueError: the file is not a snapshot.
+        """
+        with open(filepath, "rb") as f: 
+            buf = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, n, m, names_size, genders_size = struct.unpack_from(SNAPSHOT_HEADER, buf)
+        if magic != SNAPSHOT_MAGIC: 
+            raise ValueError(f"{filepath} is not a family snapshot")
+        view = memoryview(buf)
+        sections = {}
+        offset = struct.calcsize(SNAPSHOT_HEADER)
+        for name, code, count in (("parent_offsets", "I", n + 1), ("parent_ids", "I", m), 
+                                  ("spouses", "i", n), ("name_offsets", "Q", n + 1), 
+                                  ("sorted_ids", "I", n), ("genders", "B", n), 
+                                  ("names", "B", names_size), ("gender_names", "B", genders_size)): 
+            size = count * struct.calcsize(code)
+            sections[name] = view[offset:offset + size].cast(code)
+            offset += _padding(size)
+        family = cls.__new__(cls)
+        family.parent_offsets = sections["parent_offsets"]
+        family.parent_ids = sections["parent_ids"]
+        family.spouses = sections["spouses"]
+        family.genders = sections["genders"]
+        family.names = _SnapshotNames(sections["names"], sections["name_offsets"])
+        family.ids = _SnapshotIds(family.names, sections["sorted_ids"])
+        family.gender_names = bytes(sections["gender_names"]).decode("utf-8").split("\n")
+        family.cache_size = cache_size
+        family._connections = OrderedDict()
+        family._buffer = buf
+        return family
+    
+    def write_snapshot(self, filepath): 
+        """Writes the family to a binary snapshot that from_snapshot can open.
+        
+        The file holds a header followed by the raw arrays in native byte 
+        order, so it is meant to be opened on the same kind of machine.
+
+        Args:
+            filepath (str): The path to write.
+            
+        Side effects: 
+            Creates or overwrites the file.
+        """
+        encoded = [name.encode("utf-8") for name in self.names]
+        name_offsets = array("Q", [0])
+        for name in encoded: 
+            name_offsets.append(name_offsets[-1] + len(name))
+        sorted_ids = array("I", sorted(range(len(encoded)), key = encoded.__getitem__))
+        gender_names = "\n".join(self.gender_names).encode("utf-8")
+        names = b"".join(encoded)
+        with open(filepath, "wb") as f: 
+            f.write(struct.pack(SNAPSHOT_HEADER, SNAPSHOT_MAGIC, len(self.names), 
+                                len(self.parent_ids), len(names), len(gender_names)))
+            for section in (array("I", self.parent_offsets), array("I", self.parent_ids), 
+                            array("i", self.spouses), name_offsets, sorted_ids, 
+                            bytes(self.genders), names, gender_names): 
+                data = bytes(section)
+                f.write(data + b"\0" * (_padding(len(data)) - len(data)))
+    
+    def __len__(self): 
+        """Returns the number of people in the family."""
+        return len(self.names)
+    
+    def parents_of(self, i): 
+        """Returns the parent ids of an id.
+
+        Args:
+            i (int): a person's id.
+
+        Returns:
+            array: the ids of the person's parents.
+        """
+        return self.parent_ids[self.parent_offsets[i]:self.parent_offsets[i + 1]]
+    
+    def person(self, name): 
+        """Makes a Person object for one individual.
+        
+        The parents and spouse are Person objects too, but only their names 
+        and genders are filled in.
+
+        Args:
+            name (str): a name in the family.
+
+        Returns:
+            Person: a new, standalone Person.
+        """
+        i = self.ids[name]
+        person = Person(name, self.gender_names[self.genders[i]])
+        for parent in self.parents_of(i): 
+            person.add_parent(Person(self.names[parent], self.gender_names[self.genders[parent]]))
+        spouse = self.spouses[i]
+        if spouse != -1: 
+            person.set_spouse(Person(self.names[spouse], self.gender_names[self.genders[spouse]]))
+        return person
+    
+    def connections(self, i): 
+        """Returns the connection map of an id, the same walk as Person.build_connections.
+
+        Maps are kept in a least-recently-used cache of cache_size entries 
+        and must not be modified.
+
+        Args:
+            i (int): a person's id.
+
+        Returns:
+            dict: each reachable id mapped to its path of "P" and "S" steps.
+        """
+        cdict = self._connections.get(i)
+        if cdict is not None: 
+            self._connections.move_to_end(i)
+            return cdict
+        cdict = {i: ''} 
+        queue = deque([i])
+        parent_offsets = self.parent_offsets
+        parent_ids = self.parent_ids
+        spouses = self.spouses
+        while queue: 
+            person = queue.popleft() 
+            personpath = cdict[person]
+            
+            for k in range(parent_offsets[person], parent_offsets[person + 1]): 
+                parent = parent_ids[k]
+                if parent not in cdict: 
+                    cdict[parent] = personpath + "P"
+                    queue.append(parent)
+            
+            spouse = spouses[person]
+            if 'S' not in personpath and spouse != -1 and spouse not in cdict: 
+                cdict[spouse] = personpath + "S"
+                queue.append(spouse)
+        self._connections[i] = cdict
+        if len(self._connections) > self.cache_size: 
+            self._connections.popitem(last = False)
+        return cdict
+    
+    def relation(self, name1, name2): 
+        """Returns the determined relationship between two individuals.
+
+        Args:
+            name1 (str): Name of a person in the family tree 
+            name2 (str): Name of a second person in the family tree
+
+        Returns:
+            None or str: a kindship term
+        """
+        i = self.ids[name1]
+        j = self.ids[name2]
+        return relation_from_connections(self.connections(i), self.connections(j), 
+                                         self.gender_names[self.genders[i]])
+
+    
+# the gender code of someone named in a record before their individuals entry
+NO_GENDER = 255
+
+SNAPSHOT_MAGIC = b"KINSNAP1"
+SNAPSHOT_HEADER = "=8sQQQQ"
+
+
+def _padding(size): 
+    """Rounds a section size up to a multiple of 8 bytes."""
+    return (size + 7) // 8 * 8
+
+
+class _SnapshotNames(): 
+    """The names in a snapshot, decoded one at a time as they are used."""
+    def __init__(self, blob, offsets): 
+        self.blob = blob
+        self.offsets = offsets
+    
+    def __len__(self): 
+        return len(self.offsets) - 1
+    
+    def encoded(self, i): 
+        """Returns the UTF-8 bytes of name i."""
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+    
+    def __getitem__(self, i): 
+        return self.encoded(i).decode("utf-8")
+    
+    def __iter__(self): 
+        for i in range(len(self)): 
+            yield self[i]
+
+
+class _SnapshotIds(): 
+    """Maps names to ids in a snapshot by binary search over the sorted names."""
+    def __init__(self, names, sorted_ids): 
+        self.names = names
+        self.sorted_ids = sorted_ids
+    
+    def __getitem__(self, name): 
+        key = name.encode("utf-8")
+        low, high = 0, len(self.sorted_ids)
+        while low < high: 
+            middle = (low + high) // 2
+            if self.names.encoded(self.sorted_ids[middle]) < key: 
+                low = middle + 1
+            else: 
+                high = middle
+        if low < len(self.sorted_ids) and self.names.encoded(self.sorted_ids[low]) == key: 
+            return self.sorted_ids[low]
+        raise KeyError(name)
+    
+    def __contains__(self, name): 
+        try: 
+            self[name]
+        except KeyError: 
+            return False
+        return True
+
+
+# the characters a JSON number is made of
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*\Z")
+
+
+class _JSONStream(): 
+    """Reads a JSON document piece by piece from a file.
+    
+    Only the value being read is held in memory, so the members of a large 
+    object or array can be processed one at a time.
+    """
+    def __init__(self, f, chunk_size = 1 << 16): 
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+    
+    def _fill(self): 
+        """Reads another chunk, dropping what has been used. Returns False at the end of the file."""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk: 
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def peek(self): 
+        """Skips whitespace and returns the next character, or "" at the end."""
+        while True: 
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n": 
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill(): 
+                return self.buf[self.pos:self.pos + 1]
+    
+    def expect(self, char): 
+        """Consumes the next character, which must be char."""
+        if self.peek() != char: 
+            raise ValueError(f"expected {char!r} at offset {self.pos} of the JSON chunk")
+        self.pos += 1
+    
+    def value(self): 
+        """Reads one complete JSON value."""
+        self.peek()
+        while True: 
+            try: 
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError: 
+                if not self._fill(): 
+                    raise
+                continue
+            # a number whose text runs to the end of the buffer, maybe cut at 
+            # a digit, "." or "e", may continue in the next chunk
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and \
+                    not self.eof and _NUMBER_TAIL.match(self.buf, end) and self._fill(): 
+                continue
+            self.pos = end
+            return value
+    
+    def members(self): 
+        """Yields the keys of an object; the caller must read each value."""
+        self.expect("{")
+        if self.peek() == "}": 
+            self.pos += 1
+            return
+        while True: 
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",": 
+                self.pos += 1
+            else: 
+                self.expect("}")
+                return
+    
+    def elements(self): 
+        """Yields the elements of an array, each read with value()."""
+        self.expect("[")
+        if self.peek() == "]": 
+            self.pos += 1
+            return
+        while True: 
+            yield self.value()
+            if self.peek() == ",": 
+                self.pos += 1
+            else: 
+                self.expect("]")
+                return
+
+
+def iter_family_file(filepath): 
+    """Streams the contents of a family JSON file without loading it whole.
 
     Args:
         filepath (str): The path to the JSON file.
+
+    Yields:
+        tuple: ("individual", name, gender), ("parents", name, parent names) 
+        and ("couple", name1, name2) records, in file order.
+    """
+    with open(filepath, "r", encoding = "utf-8") as f: 
+        stream = _JSONStream(f)
+        for section in stream.members(): 
+            if section == "individuals": 
+                for name in stream.members(): 
+                    yield "individual", name, stream.value()
+            elif section == "parents": 
+                for name in stream.members(): 
+                    yield "parents", name, stream.value()
+            elif section == "couples": 
+                for couple in stream.elements(): 
+                    yield "couple", couple[0], couple[1]
+            else: 
+                stream.value()
+
+
+def load_family_stream(filepath): 
+    """Builds a Family from a JSON file as it is read.
+    
+    People are created as their records arrive. Parent and couple records 
+    that name someone not read yet are held until the end of the file. Once 
+    one couple is held, the couples after it are held too, so remarriages 
+    are still applied in file order.
+
+    Args:
+        filepath (str): The path to the JSON file.
+
+    Returns:
+        Family: the same family Family(json.load(f)) would build.
+    """
+    family = Family({'individuals': {}, 'parents': {}, 'couples': []})
+    people = family.people
+    waiting = []
+    couples_waiting = False
+    for record in iter_family_file(filepath): 
+        kind, name, value = record
+        if kind == "individual": 
+            person = Person(name, value)
+            person.family = family
+            people[name] = person
+        elif kind == "parents" and name in people and all(parent in people for parent in value): 
+            for parent in value: 
+                people[name].parents.append(people[parent])
+        elif kind == "couple" and name in people and value in people and not couples_waiting: 
+            people[name].spouse = people[value]
+            people[value].spouse = people[name]
+        else: 
+            couples_waiting = couples_waiting or kind == "couple"
+            waiting.append(record)
+    for kind, name, value in waiting: 
+        if kind == "parents": 
+            for parent in value: 
+                people[name].parents.append(people[parent])
+        else: 
+            people[name].spouse = people[value]
+            people[value].spouse = people[name]
+    return family
+
+
+def load_family(filepath, stream = False, compact = False): 
+    """Loads a family from a JSON file or a snapshot.
+
+    Args:
+        filepath (str): The path to a family JSON file or a snapshot written 
+            by CompactFamily.write_snapshot.
+        stream (bool, optional): Read JSON as it is parsed, with 
+            load_family_stream or CompactFamily.from_records, instead of 
+            json.load. Defaults to False.
+        compact (bool, optional): Build a CompactFamily from JSON. Defaults to 
+            False. Snapshots always open as a CompactFamily.
+
+    Returns:
+        Family or CompactFamily: the loaded family.
+    """
+    with open(filepath, "rb") as f: 
+        is_snapshot = f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    if is_snapshot: 
+        return CompactFamily.from_snapshot(filepath)
+    if stream: 
+        if compact: 
+            return CompactFamily.from_records(iter_family_file(filepath))
+        return load_family_stream(filepath)
+    with open(filepath, "r", encoding = "utf-8") as f: 
+        familydata = json.load(f)
+    return CompactFamily(familydata) if compact else Family(familydata)
+
+
+def relations_to_everyone(family, name): 
+    """Yields the relationship of everyone in a family to one person.
+    
+    The person's connection map is built once and reused for every pair.
+
+    Args:
+        family (Family or CompactFamily): the family tree.
+        name (str): the person everyone is compared to.
+
+    Yields:
+        tuple: (other name, name, relation) for every other person, where 
+        relation is what family.relation(other name, name) returns. If name 
+        is not in the family, the only tuple is (None, name, a ValueError 
+        that says so).
+    """
+    if name not in (family.people if isinstance(family, Family) else family.ids): 
+        yield None, name, ValueError(f"unknown person: {name}")
+        return
+    names = family.people if isinstance(family, Family) else family.names
+    for other in names: 
+        if other != name: 
+            yield other, name, family.relation(other, name)
+
+
+def batch_relations(family, pairs, max_cache_size = 100_000): 
+    """Yields the relationship for every pair of names.
+    
+    Connection maps are cached by the family, and while the batch runs the 
+    cache is made large enough to hold everyone the pairs name, up to 
+    max_cache_size, so each distinct person's map is only built once however 
+    many pairs they are in.
+
+    A pair that is not two names, or that names someone not in the family, 
+    does not stop the batch: its relation is the ValueError that says why.
+
+    Args:
+        family (Family or CompactFamily): the family tree.
+        pairs (iterable of tuple): (name1, name2) pairs, as read_pairs gives 
+            them.
+        max_cache_size (int, optional): the most connection maps cached 
+            during the batch. Defaults to 100,000.
+
+    Yields:
+        tuple: (name1, name2, relation) for each pair, in order. For a pair 
+        that is not two names, name1 is the pair joined by a tab and name2 
+        is None.
+        
+    Side effects: 
+        Raises family.cache_size for the batch, and afterwards sets it back 
+        and drops the maps used longest ago past it.
+    """
+    pairs = list(pairs)
+    people = {name for pair in pairs if len(pair) == 2 for name in pair}
+    cache_size = family.cache_size
+    family.cache_size = max(cache_size, min(len(people), max_cache_size))
+    try: 
+        for pair in pairs: 
+            if len(pair) != 2: 
+                yield "\t".join(pair), None, ValueError("expected two names separated by a tab")
+                continue
+            name1, name2 = pair
+            try: 
+                relation = family.relation(name1, name2)
+            except KeyError as e: 
+                relation = ValueError(f"unknown person: {e.args[0]}")
+            yield name1, name2, relation
+    finally: 
+        family.cache_size = cache_size
+        while len(family._connections) > cache_size: 
+            family._connections.popitem(last = False)
+
+
+_worker_family = None
+
+
+def _load_worker_family(filepath, stream, compact): 
+    """Loads the family once in each worker process."""
+    global _worker_family
+    _worker_family = load_family(filepath, stream, compact)
+
+
+def _worker_relations(pairs): 
+    """Answers one chunk of pairs in a worker process."""
+    return list(batch_relations(_worker_family, pairs))
+
+
+def batch_relations_parallel(filepath, pairs, workers, chunk_size = 1000, 
+                             stream = False, compact = False): 
+    """Yields the relationship for every pair, spread over worker processes.
+    
+    Each worker loads the family file once, then answers chunks of pairs with 
+    its own connection map cache, the same way batch_relations does.
+
+    Args:
+        filepath (str): The path to the JSON file, or to a snapshot.
+        pairs (iterable of tuple): (name1, name2) pairs.
+        workers (int): the number of worker processes.
+        chunk_size (int, optional): pairs per chunk. Defaults to 1000.
+        stream (bool, optional): Read the JSON file incrementally. Defaults 
+            to False.
+        compact (bool, optional): Use CompactFamily instead of Family. 
+            Defaults to False.
+
+    Yields:
+        tuple: (name1, name2, relation) for each pair, in order.
+    """
+    pairs = list(pairs)
+    chunks = [pairs[start:start + chunk_size] for start in range(0, len(pairs), chunk_size)]
+    with ProcessPoolExecutor(max_workers = workers, initializer = _load_worker_family, 
+                             initargs = (filepath, stream, compact)) as pool: 
+        for results in pool.map(_worker_relations, chunks): 
+            yield from results
+
+
+def read_pairs(filepath): 
+    """Reads name pairs from a text file, one tab-separated pair per line.
+
+    Args:
+        filepath (str): The path to the pairs file.
+
+    Returns:
+        list of tuple: the (name1, name2) pairs. A line that is not two 
+        tab-separated names gives a tuple of whatever fields it has, which 
+        batch_relations reports as an error.
+    """
+    with open(filepath, "r", encoding = "utf-8") as f: 
+        return [tuple(line.rstrip("\r\n").split("\t")) for line in f if line.strip()]
+
+
+def write_relations(results, out = sys.stdout): 
+    """Writes relationship results as JSON Lines as they are computed.
+
+    Args:
+        results (iterable of tuple): (name1, name2, relation) tuples. A 
+            relation that is an exception is written as an error.
+        out (file, optional): where to write. Defaults to stdout.
+        
+    Side effects: 
+        Writes to out.
+    """
+    for name1, name2, relation in results: 
+        if isinstance(relation, Exception): 
+            record = {"name1": name1, "name2": name2, "error": str(relation)}
+        else: 
+            record = {"name1": name1, "name2": name2, "relation": relation}
+        out.write(json.dumps(record) + "\n")
+
+
+def main(filepath, name1, name2, compact = False, stream = False): 
+    """Finalizes the relationship between two individuals using the specified file.
+
+    Args:
+        filepath (str): The path to the JSON file, or to a snapshot.
         name1 (str): The name of a person located in the JSON file.
         name2 (str): The name of a second person located in the JSON file.
+        compact (bool, optional): Use CompactFamily instead of Family. 
+            Defaults to False.
+        stream (bool, optional): Read the JSON file incrementally. Defaults 
+            to False.
         
     Side effects: 
         Prints to the consule. 
     """
-    with open(filepath, "r", encoding = "utf-8") as f: 
-        familydata = json.load(f)
-        family_connection = Family(familydata)
-        family_connection.relation(name1, name2)
-        if family_connection.relation(name1, name2) == None: 
-            print(f"{name1} is not related to {name2}")
-        else: 
-            print(f"{name1} is {name2}'s {family_connection.relation(name1,name2)}")
+    family_connection = load_family(filepath, stream, compact)
+    relation = family_connection.relation(name1, name2)
+    if relation == None: 
+        print(f"{name1} is not related to {name2}")
+    else: 
+        print(f"{name1} is {name2}'s {relation}")
 
 def parse_args(argslist): 
     """Parse command-line arguments.
@@ -171,13 +1347,43 @@ def parse_args(argslist):
         A namespace: The parsed arguments as a namespace.
     """
     parser = ArgumentParser()
-    parser.add_argument("filepath", help = "a filepath to the json file")
-    parser.add_argument("name1", help = "a first name defined in the json file")
-    parser.add_argument("name2", help = "a second name defined in the json file")
+    parser.add_argument("filepath", help = "a filepath to the json file or a snapshot")
+    parser.add_argument("name1", nargs = "?", help = "a first name defined in the json file")
+    parser.add_argument("name2", nargs = "?", help = "a second name defined in the json file")
+    parser.add_argument("--compact", action = "store_true", 
+                        help = "use the compact integer-id family backend")
+    parser.add_argument("--stream", action = "store_true", 
+                        help = "read the json file incrementally")
+    parser.add_argument("--save-snapshot", metavar = "PATH", 
+                        help = "write a binary snapshot of the family to open quickly later")
+    batch = parser.add_mutually_exclusive_group()
+    batch.add_argument("--pairs", 
+                       help = "a file of tab-separated name pairs to relate, written as JSON Lines")
+    batch.add_argument("--against", 
+                       help = "relate everyone to this name, written as JSON Lines")
+    parser.add_argument("--workers", type = int, default = 1, 
+                        help = "worker processes for --pairs (default: 1)")
     
-    return parser.parse_args(argslist)
+    args = parser.parse_args(argslist)
+    if not (args.pairs or args.against or args.save_snapshot) and not (args.name1 and args.name2): 
+        parser.error("name1 and name2 are required unless --pairs, --against or"
+                     " --save-snapshot is given")
+    return args
 
 
 if __name__ == "__main__":
     args = parse_args(sys.argv[1:])
-    main(args.filepath, args.name1, args.name2)
\ No newline at end of file
+    if args.save_snapshot: 
+        family = load_family(args.filepath, args.stream, compact = True)
+        family.write_snapshot(args.save_snapshot)
+    elif args.pairs and args.workers > 1: 
+        write_relations(batch_relations_parallel(args.filepath, read_pairs(args.pairs), args.workers, 
+                                                 stream = args.stream, compact = args.compact))
+    elif args.pairs or args.against: 
+        family = load_family(args.filepath, args.stream, args.compact)
+        if args.pairs: 
+            write_relations(batch_relations(family, read_pairs(args.pairs)))
+        else: 
+            write_relations(relations_to_everyone(family, args.against))
+    else: 
+        main(args.filepath, args.name1, args.name2, args.compact, args.stream)
\ No newline at end of file
@@ -0,0 +1,365 @@
+"""Serve kinship relation queries from family trees kept loaded in memory.
+
+Running kinship.py once per question reads the family file, builds the tree
+and imports the relationships table every time. This server does that once
+per family at startup and then answers questions over TCP or a Unix socket,
+one JSON request per line:
+
+    {"id": 1, "family": "smith", "name1": "Ann", "name2": "Bob"}
+    {"id": 2, "type": "metrics"}
+
+and one JSON response per line, tagged with the same id:
+
+    {"id": 1, "ok": true, "result": "sister", "cached": false, "ms": 0.041}
+    {"id": 2, "ok": true, "result": {"requests": 1, "p50_ms": 0.041, ...}}
+
+The family can be left out when only one is loaded. Recent answers are kept
+in a least-recently-used cache, and the time taken by every request is kept
+so the metrics request can report latency percentiles.
+"""
+
+from argparse import ArgumentParser
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import time
+
+from kinship import AncestryIndex, Family, load_family
+
+
+class RelationCache:
+    """A least-recently-used cache of relation answers.
+
+    Attributes:
+        max_entries (int): the most answers kept.
+        hits (int): the number of lookups that found an answer.
+        misses (int): the number of lookups that did not.
+    """
+    def __init__(self, max_entries=100_000):
+        """Initializes a RelationCache.
+
+        Args:
+            max_entries (int, optional): the size cap. Defaults to 100,000.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Looks up the answer stored for a key.
+
+        Args:
+            key (tuple): (family, name1, name2).
+
+        Returns:
+            tuple: (True, relation) if the key is cached, otherwise
+            (False, None).
+
+        Side effects:
+            Marks the entry as recently used and updates the hit and miss
+            counts.
+        """
+        try:
+            relation = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, relation
+
+    def put(self, key, relation):
+        """Stores an answer, evicting the least recently used past the cap.
+
+        Args:
+            key (tuple): (family, name1, name2).
+            relation (str or None): the answer.
+        """
+        self._entries[key] = relation
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        """Returns the number of cached answers."""
+        return len(self._entries)
+
+
+class LatencyMetrics:
+    """Per-request latencies over a window of recent requests.
+
+    Attributes:
+        requests (int): the number of requests recorded since startup.
+        errors (int): how many of them failed.
+        window (deque): the latencies of the most recent requests, in
+            seconds.
+    """
+    def __init__(self, window=10_000):
+        """Initializes a LatencyMetrics.
+
+        Args:
+            window (int, optional): how many recent latencies are kept for
+                the percentiles. Defaults to 10,000.
+        """
+        self.requests = 0
+        self.errors = 0
+        self.window = deque(maxlen=window)
+
+    def record(self, seconds, ok=True):
+        """Records one request.
+
+        Args:
+            seconds (float): how long the request took.
+            ok (bool, optional): whether it succeeded. Defaults to True.
+        """
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        self.window.append(seconds)
+
+    def summary(self):
+        """Summarizes the recorded latencies.
+
+        Returns:
+            dict: the request and error counts, and the mean, 50th, 95th and
+            99th percentile and largest latency in the window, in
+            milliseconds.
+        """
+        latencies = sorted(self.window)
+        summary = {"requests": self.requests, "errors": self.errors}
+        if not latencies:
+            return summary
+        summary["mean_ms"] = round(sum(latencies) / len(latencies) * 1000, 3)
+        for percentile in (50, 95, 99):
+            rank = min(len(latencies) - 1, len(latencies) * percentile // 100)
+            summary[f"p{percentile}_ms"] = round(latencies[rank] * 1000, 3)
+        summary["max_ms"] = round(latencies[-1] * 1000, 3)
+        return summary
+
+
+def load_families(specs, stream=False, compact=False):
+    """Loads every family named on the command line.
+
+    Args:
+        specs (list of str): NAME=PATH entries, or bare paths, which are
+            named after the file without its extension.
+        stream (bool, optional): read JSON files incrementally. Defaults to
+            False.
+        compact (bool, optional): use CompactFamily. Defaults to False.
+
+    Returns:
+        dict: each family name mapped to its Family or CompactFamily.
+
+    Raises:
+        ValueError: two entries have the same name.
+    """
+    families = {}
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep:
+            path = spec
+            name = os.path.splitext(os.path.basename(spec))[0]
+        if name in families:
+            raise ValueError(f"family {name} is given more than once")
+        families[name] = load_family(path, stream, compact)
+    return families
+
+
+class KinshipServer:
+    """Answers relation requests from socket clients.
+
+    Answers that are not cached are worked out on one worker thread, so a
+    slow one, such as an AncestryIndex pair whose meeting points are not
+    cached yet, does not hold up the event loop, and the families are only
+    ever used by one thread.
+
+    Attributes:
+        families (dict): each family name mapped to the object that answers
+            its relation queries: an AncestryIndex over a Family, or a
+            CompactFamily.
+        cache (RelationCache): recent answers.
+        metrics (LatencyMetrics): request latencies.
+    """
+    def __init__(self, families, cache_size=100_000):
+        """Initializes a KinshipServer.
+
+        Args:
+            families (dict): each family name mapped to a loaded Family or
+                CompactFamily.
+            cache_size (int, optional): the most answers cached. Defaults to
+                100,000.
+        """
+        self.families = {name: AncestryIndex(family) if isinstance(family, Family)
+                         else family for name, family in families.items()}
+        self.cache = RelationCache(cache_size)
+        self.metrics = LatencyMetrics()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _lookup(self, family, name1, name2):
+        """Works out a relation from the family; runs on the worker thread."""
+        try:
+            return self.families[family].relation(name1, name2)
+        except KeyError as e:
+            raise ValueError(f"unknown person: {e.args[0]}") from None
+
+    async def relation(self, family, name1, name2):
+        """Returns the relation between two people, from the cache if possible.
+
+        Args:
+            family (str or None): the family name, which can be None when
+                only one family is loaded.
+            name1 (str): the first person's name.
+            name2 (str): the second person's name.
+
+        Returns:
+            tuple: the relation (str or None) and whether it was cached.
+
+        Raises:
+            ValueError: the family or either person is unknown.
+        """
+        if family is None and len(self.families) == 1:
+            family = next(iter(self.families))
+        if family is None:
+            raise ValueError("request needs a family when more than one is loaded")
+        if family not in self.families:
+            raise ValueError(f"unknown family: {family}")
+        key = (family, name1, name2)
+        found, relation = self.cache.get(key)
+        if found:
+            return relation, True
+        relation = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._lookup, family, name1, name2)
+        self.cache.put(key, relation)
+        return relation, False
+
+    async def answer(self, request):
+        """Builds the response for one decoded request.
+
+        Args:
+            request (dict): the request, with a type of relation (the
+                default) or metrics, and for relation requests name1, name2
+                and, when more than one family is loaded, family keys.
+
+        Returns:
+            dict: the response.
+        """
+        response = {"id": request.get("id")}
+        kind = request.get("type", "relation")
+        if kind == "metrics":
+            result = self.metrics.summary()
+            result.update(cache_entries=len(self.cache), cache_hits=self.cache.hits,
+                          cache_misses=self.cache.misses)
+            response.update(ok=True, result=result)
+            return response
+        name1 = request.get("name1")
+        name2 = request.get("name2")
+        if kind != "relation" or not isinstance(name1, str) or not isinstance(name2, str):
+            response.update(ok=False, error="request needs a type of relation or"
+                            " metrics, and string name1 and name2 for relation")
+            return response
+        try:
+            relation, cached = await self.relation(request.get("family"), name1, name2)
+        except ValueError as e:
+            response.update(ok=False, error=str(e))
+        else:
+            response.update(ok=True, result=relation, cached=cached)
+        return response
+
+    async def _answer_line(self, line, writer):
+        """Answers one request line, times it and writes the response line."""
+        start = time.perf_counter()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            response = {"id": None, "ok": False, "error": f"bad request: {e}"}
+        else:
+            response = await self.answer(request)
+        seconds = time.perf_counter() - start
+        self.metrics.record(seconds, response["ok"])
+        response["ms"] = round(seconds * 1000, 3)
+        writer.write(json.dumps(response).encode('UTF-8') + b"\n")
+        await writer.drain()
+
+    async def handle_client(self, reader, writer):
+        """Reads requests from one connection until it closes.
+
+        Connections are served concurrently. Requests on one connection
+        are answered in order; an answer that is not cached is awaited from
+        the worker thread, so other connections are served meanwhile.
+        """
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    await self._answer_line(line, writer)
+        finally:
+            writer.close()
+
+    async def serve(self, host=None, port=None, path=None):
+        """Runs the server until cancelled.
+
+        Args:
+            host (str, optional): the TCP host to listen on.
+            port (int, optional): the TCP port to listen on.
+            path (str, optional): a Unix socket path to listen on instead.
+        """
+        if path:
+            server = await asyncio.start_unix_server(self.handle_client, path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=False)
+
+
+def parse_args(arglist):
+    """Parse command-line arguments.
+
+    This function expects one or more family arguments, each a path to a
+    family JSON file or snapshot, optionally prefixed with NAME= to name it.
+    It allows the following optional arguments:
+
+        --host (str): the TCP host to listen on (default: 127.0.0.1)
+        --port (int): the TCP port to listen on (default: 8766)
+        --socket (str): a Unix socket path to listen on instead of TCP
+        --compact: use the compact integer-id family backend
+        --stream: read JSON files incrementally
+        --cache-size (int): the most answers cached (default: 100000)
+
+    Args:
+        arglist (list of str): command-line arguments.
+
+    Returns:
+        namespace: the parsed arguments.
+    """
+    parser = ArgumentParser()
+    parser.add_argument("families", nargs="+", metavar="[NAME=]PATH",
+                        help="a family JSON file or snapshot to keep loaded")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="TCP host to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8766,
+                        help="TCP port to listen on (default: 8766)")
+    parser.add_argument("--socket", help="Unix socket path to listen on")
+    parser.add_argument("--compact", action="store_true",
+                        help="use the compact integer-id family backend")
+    parser.add_argument("--stream", action="store_true",
+                        help="read JSON files incrementally")
+    parser.add_argument("--cache-size", type=int, default=100_000,
+                        help="most answers cached (default: 100000)")
+    return parser.parse_args(arglist)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    server = KinshipServer(load_families(args.families, args.stream, args.compact),
+                           args.cache_size)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,107 @@
+"""Scan the lines of a large text file through a memory map.
+
+The readers in parse_addresses.py and phone_numbers.py open files in text
+mode, which decodes every line into a new str before any matching happens.
+The functions here map the file into memory instead and take it a block of
+lines at a time, matching all of a block's lines with one findall call of a
+bytes regex, so only the captured groups need to be decoded.
+"""
+
+from contextlib import contextmanager
+import mmap
+import re
+
+# bytes that a bytes pattern can not match as the text readers do: a carriage
+# return, which $ would leave inside the last group, and the separators
+# \x1c-\x1f, which are whitespace to a str \s but not to a bytes \s
+_LINE_BY_LINE = re.compile(rb'[\r\x1c-\x1f]')
+
+
+@contextmanager
+def open_mmap(filepath):
+    """Opens a file as a read-only memory map.
+
+    Args:
+        filepath (str): the path to the file.
+
+    Yields:
+        mmap or bytes: the mapped file, or an empty bytes object if the file
+        is empty (an empty file can not be mapped).
+    """
+    with open(filepath, 'rb') as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b''
+            return
+        try:
+            yield buf
+        finally:
+            try:
+                buf.close()
+            except BufferError:
+                # a caller still holds a match into the map; it is closed
+                # once that match is garbage collected
+                pass
+
+
+def compile_bytes(regex, flags=0):
+    """Compiles a str regular expression as a multi-line bytes pattern.
+
+    Args:
+        regex (str): a regular expression written for str input.
+        flags (int, optional): extra re flags. Defaults to 0.
+
+    Returns:
+        re.Pattern: the compiled bytes pattern.
+    """
+    return re.compile(regex.encode('UTF-8'), flags | re.MULTILINE)
+
+
+def iter_blocks(buf, block_size=1 << 20):
+    """Splits a buffer into blocks of whole lines.
+
+    Args:
+        buf (mmap or bytes): the buffer to split.
+        block_size (int, optional): about how many bytes go in a block. A
+            block runs on to the end of the line it would otherwise cut.
+            Defaults to 1 MiB.
+
+    Yields:
+        bytes: a copy of each block, without the newline that ends it.
+    """
+    start = 0
+    size = len(buf)
+    while start < size:
+        newline = buf.find(b'\n', min(start + block_size, size) - 1)
+        if newline == -1:
+            newline = size
+        yield buf[start:newline]
+        start = newline + 1
+
+
+def match_block(block, pattern):
+    """Matches a pattern against every line of a block in one call.
+
+    One findall over the block replaces a search per line. The pattern must
+    start with ^ and end with $, so every match starts a line, and a match
+    that ran over a newline would swallow the start of the next line. There
+    are as many matches as lines only if every line matched on its own.
+
+    Args:
+        block (bytes): whole lines, as given by iter_blocks.
+        pattern (re.Pattern): a compiled bytes pattern with at least two
+            groups, anchored with ^ and $, from compile_bytes.
+
+    Returns:
+        list or None: the groups of each line's match, as findall gives
+        them, or None if some line does not match, the block has a carriage
+        return, which $ would leave inside the last group, or the block
+        holds bytes that bytes classes such as \\s and \\S do not match as
+        they would in a str: anything outside ASCII, and the separators
+        \\x1c-\\x1f. Those blocks have to be matched a line at a time.
+    """
+    if not block.isascii() or _LINE_BY_LINE.search(block):
+        return None
+    rows = pattern.findall(block)
+    return rows if len(rows) == block.count(b'\n') + 1 else None
@@ -4,9 +4,31 @@
 """Perform fixed-rate mortgage calculations."""
 
 from argparse import ArgumentParser
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import csv
+from decimal import Context, Decimal, ROUND_CEILING, ROUND_HALF_UP
+from fractions import Fraction
+from functools import lru_cache
+from itertools import islice
+import json
 import math
+import random
+import statistics
 import sys
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
 def get_min_payment(p, interest_rate, term_years = 30, payments_per_year = 12 ):
     """Computes the minimum monrthly mortgage payment using a formula.
 
@@ -53,6 +75,8 @@ def remaining_payments(balance, interest_rate, target_payment, payments_per_year
     Returns:
         int: the number of payments that is required to pay off the mortgage.
     """
+    if balance > 0 and target_payment <= interest_due(balance, interest_rate, payments_per_year):
+        raise ValueError("target payment does not cover the interest due")
     counter = 0 
     while balance > 0: 
         interest_payment = interest_due(balance, interest_rate, payments_per_year)
@@ -60,8 +84,763 @@ def remaining_payments(balance, interest_rate, target_payment, payments_per_year
         balance -= principal_payment 
         counter += 1
     return counter
+
+
+def balance_after(balance, interest_rate, target_payment, k, payments_per_year = 12):
+    """Computes the balance left after k payments in closed form.
+
+    Args:
+        balance (float): the starting balance.
+        interest_rate (float): annual interest rate, a float between 0 and 1.
+        target_payment (float): the amount paid each period.
+        k (int): the number of payments made.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+
+    Returns:
+        float: the balance after k payments, negative once it is overpaid.
+    """
+    r = interest_rate / payments_per_year
+    if r == 0:
+        return balance - target_payment * k
+    growth = (1 + r) ** k
+    return balance * growth - target_payment * (growth - 1) / r
+
+
+def payoff_count(balance, interest_rate, target_payment, payments_per_year = 12):
+    """Calculates the number of payments to pay off a mortgage without stepping through them.
+
+    Solves balance * (1 + r) ** n - target_payment * ((1 + r) ** n - 1) / r <= 0
+    for the smallest whole n with the annuity logarithm formula, then checks
+    the payments on either side of the answer so that a last payment that is
+    only just needed (or only just not needed) is counted the same way as
+    remaining_payments counts it.
+
+    Balances, rates and payments can also be NumPy arrays (or, without NumPy,
+    lists), which are solved element by element in one pass.
+
+    Args:
+        balance (float or array): balance of mortgage, a positive number.
+        interest_rate (float or array): annual interest rate, a float between 0 and 1.
+        target_payment (float or array): the amount paid each period, a positive number.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+
+    Returns:
+        int or array: the number of payments. For arrays, loans whose payment
+        does not cover the interest get -1.
+
+    Raises:
+        ValueError: a single (non-array) target payment does not cover the
+            interest due, so the mortgage would never be paid off.
+    """
+    if np is not None and any(isinstance(arg, np.ndarray) for arg in
+                              (balance, interest_rate, target_payment)):
+        return _payoff_count_array(balance, interest_rate, target_payment, payments_per_year)
+    if isinstance(balance, (list, tuple)):
+        return [_payoff_count_or_none(b, i, t, payments_per_year) for b, i, t in
+                zip(balance, _repeat(interest_rate, balance), _repeat(target_payment, balance))]
+    if balance <= 0:
+        return 0
+    r = interest_rate / payments_per_year
+    if target_payment <= r * balance:
+        raise ValueError("target payment does not cover the interest due")
+    if r == 0:
+        n = math.ceil(balance / target_payment)
+    else:
+        n = math.ceil(math.log(target_payment / (target_payment - r * balance))
+                      / math.log1p(r))
+    n = max(n, 1)
+    while n > 1 and balance_after(balance, interest_rate, target_payment, n - 1, payments_per_year) <= 0:
+        n -= 1
+    while balance_after(balance, interest_rate, target_payment, n, payments_per_year) > 0:
+        n += 1
+    return n
+
+
+def _repeat(value, like):
+    """Returns value as a list as long as like, unless it is already a sequence."""
+    if isinstance(value, (list, tuple)):
+        return value
+    return [value] * len(like)
+
+
+def _payoff_count_or_none(balance, interest_rate, target_payment, payments_per_year):
+    """Returns payoff_count for one loan, or -1 if it is never paid off."""
+    try:
+        return payoff_count(balance, interest_rate, target_payment, payments_per_year)
+    except ValueError:
+        return -1
+
+
+def _payoff_count_array(balance, interest_rate, target_payment, payments_per_year):
+    """Does the work of payoff_count when any argument is a NumPy array."""
+    balance, interest_rate, target_payment = np.broadcast_arrays(
+        np.asarray(balance, dtype=float), np.asarray(interest_rate, dtype=float),
+        np.asarray(target_payment, dtype=float))
+    r = interest_rate / payments_per_year
+    amortizing = target_payment > r * balance
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = target_payment / (target_payment - r * balance)
+        n = np.where(r == 0, np.ceil(balance / target_payment),
+                     np.ceil(np.log(ratio) / np.log1p(r)))
+        n = np.where(amortizing, np.maximum(n, 1), 1)
+
+        def remaining(k):
+            growth = (1 + r) ** k
+            return np.where(r == 0, balance - target_payment * k,
+                            balance * growth - target_payment * (growth - 1) / r)
+
+        n = np.where((n > 1) & (remaining(n - 1) <= 0), n - 1, n)
+        n = np.where(remaining(n) > 0, n + 1, n)
+    n = np.where(balance <= 0, 0, n)
+    return np.where(amortizing | (balance <= 0), n, -1).astype(np.int64)
     
-def main(p, interest_rate, term_years = 30, payments_per_year = 12, target_payment = None):
+SchedulePeriod = namedtuple('SchedulePeriod', 'period payment interest principal balance')
+YearSummary = namedtuple('YearSummary', 'year payment interest principal balance')
+
+
+def amortization_schedule(balance, interest_rate, target_payment, payments_per_year = 12):
+    """Yields the amortization schedule one payment at a time.
+
+    Each period the interest due is charged on the balance and the rest of
+    the payment goes to principal. The last payment is only as large as the
+    balance plus its interest, so the schedule ends at a balance of 0.
+
+    Args:
+        balance (float): balance of mortgage, a positive number.
+        interest_rate (float): annual interest rate, a float between 0 and 1.
+        target_payment (float): the amount paid each period, a positive number.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+
+    Yields:
+        SchedulePeriod: the period number (starting at 1), payment, interest,
+        principal and the balance left after the payment.
+
+    Raises:
+        ValueError: the target payment does not cover the interest due.
+    """
+    if balance > 0 and target_payment <= interest_due(balance, interest_rate, payments_per_year):
+        raise ValueError("target payment does not cover the interest due")
+    period = 0
+    while balance > 0:
+        period += 1
+        interest = interest_due(balance, interest_rate, payments_per_year)
+        payment = min(target_payment, balance + interest)
+        principal = payment - interest
+        balance = 0.0 if payment < target_payment else balance - principal
+        yield SchedulePeriod(period, payment, interest, principal, max(balance, 0.0))
+
+
+def yearly_summary(schedule, payments_per_year = 12):
+    """Totals a schedule by year as it is generated.
+
+    Args:
+        schedule (iterable of SchedulePeriod): e.g. from amortization_schedule.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+
+    Yields:
+        YearSummary: the year number (starting at 1), the total payment,
+        interest and principal paid in the year, and the balance at its end.
+    """
+    year = None
+    for row in schedule:
+        row_year = (row.period - 1) // payments_per_year + 1
+        if row_year != year:
+            if year is not None:
+                yield YearSummary(year, payment, interest, principal, balance)
+            year = row_year
+            payment = interest = principal = 0
+        payment += row.payment
+        interest += row.interest
+        principal += row.principal
+        balance = row.balance
+    if year is not None:
+        yield YearSummary(year, payment, interest, principal, balance)
+
+
+def cumulative_interest(schedule):
+    """Keeps a running total of the interest paid over a schedule.
+
+    Args:
+        schedule (iterable of SchedulePeriod): e.g. from amortization_schedule.
+
+    Yields:
+        tuple: the period number and the interest paid up to and including it.
+    """
+    total = 0.0
+    for row in schedule:
+        total += row.interest
+        yield row.period, total
+
+
+def write_schedule(out, balance, interest_rate, target_payment, payments_per_year = 12, by_year = False,
+                   exact = False):
+    """Streams an amortization schedule to a file as CSV.
+
+    Args:
+        out (file): where to write the CSV.
+        balance (float): balance of mortgage, a positive number.
+        interest_rate (float): annual interest rate, a float between 0 and 1.
+        target_payment (float): the amount paid each period, a positive number.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+        by_year (bool, optional): write yearly totals instead of every
+            payment. Defaults to False.
+        exact (bool, optional): use the cent-exact schedule from
+            amortization_schedule_cents. Defaults to False.
+
+    Side effects:
+        Writes to out.
+    """
+    if exact:
+        rows = amortization_schedule_cents(to_cents(balance), interest_rate,
+                                           to_cents(target_payment), payments_per_year)
+    else:
+        rows = amortization_schedule(balance, interest_rate, target_payment, payments_per_year)
+    if by_year:
+        rows = yearly_summary(rows, payments_per_year)
+    writer = csv.writer(out)
+    writer.writerow(YearSummary._fields if by_year else SchedulePeriod._fields)
+    for row in rows:
+        if exact:
+            writer.writerow((row[0],) + tuple(f"{value // 100}.{value % 100:02d}" for value in row[1:]))
+        else:
+            writer.writerow((row[0],) + tuple(f"{value:.2f}" for value in row[1:]))
+
+
+# one shared context for every Decimal calculation, instead of building one
+# per call or relying on the thread's current context
+DECIMAL_CONTEXT = Context(prec = 34, rounding = ROUND_HALF_UP)
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """Converts a dollar amount to a whole number of cents, rounding half up.
+
+    Args:
+        amount (float, str or Decimal): the dollar amount.
+
+    Returns:
+        int: the amount in cents.
+    """
+    context = DECIMAL_CONTEXT
+    return int(context.multiply(context.create_decimal(str(amount)).quantize(CENT, context = context), 100))
+
+
+def periodic_rate_fraction(interest_rate, payments_per_year = 12):
+    """Returns the interest rate per period as an exact fraction.
+
+    The annual rate is read from its decimal string, so 0.035 is exactly
+    35/1000 rather than the nearest binary float.
+
+    Args:
+        interest_rate (float, str or Decimal): annual interest rate, between 0 and 1.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+
+    Returns:
+        tuple of int: the numerator and denominator of the periodic rate.
+    """
+    rate = Fraction(DECIMAL_CONTEXT.create_decimal(str(interest_rate))) / payments_per_year
+    return rate.numerator, rate.denominator
+
+
+def round_division(numerator, denominator, rounding = ROUND_HALF_UP):
+    """Divides two non-negative integers, rounding to the nearest integer.
+
+    Args:
+        numerator (int): a non-negative integer.
+        denominator (int): a positive integer.
+        rounding (str, optional): decimal.ROUND_HALF_UP or
+            decimal.ROUND_HALF_EVEN for ties. Defaults to ROUND_HALF_UP.
+
+    Returns:
+        int: the rounded quotient.
+    """
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and (rounding == ROUND_HALF_UP or quotient % 2)):
+        quotient += 1
+    return quotient
+
+
+def min_payment_cents(p, interest_rate, term_years = 30, payments_per_year = 12):
+    """Computes the exact minimum payment in cents with Decimal arithmetic.
+
+    Unlike get_min_payment, which rounds up to a whole dollar, the payment is
+    rounded up to the next cent.
+
+    Args:
+        p (float, str or Decimal): the principal of the mortgage.
+        interest_rate (float, str or Decimal): annual interest rate, between 0 and 1.
+        term_years (int, optional): the term of mortgage in years. Defaults to 30.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+
+    Returns:
+        int: the minimum payment in cents.
+    """
+    context = DECIMAL_CONTEXT
+    p = context.create_decimal(str(p))
+    r = context.divide(context.create_decimal(str(interest_rate)), payments_per_year)
+    n = term_years * payments_per_year
+    if r == 0:
+        payment = context.divide(p, n)
+    else:
+        growth = context.power(context.add(1, r), n)
+        payment = context.divide(context.multiply(context.multiply(p, r), growth),
+                                 context.subtract(growth, 1))
+    return int(context.multiply(payment.quantize(CENT, rounding = ROUND_CEILING, context = context), 100))
+
+
+def exact_min_payment(p, interest_rate, term_years = 30, payments_per_year = 12):
+    """Returns min_payment_cents as an exact dollar amount.
+
+    Args:
+        p (float, str or Decimal): the principal of the mortgage.
+        interest_rate (float, str or Decimal): annual interest rate, between 0 and 1.
+        term_years (int, optional): the term of mortgage in years. Defaults to 30.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+
+    Returns:
+        Decimal: the minimum payment in dollars, e.g. Decimal('1123.87').
+    """
+    cents = min_payment_cents(p, interest_rate, term_years, payments_per_year)
+    return Decimal(cents).scaleb(-2, context = DECIMAL_CONTEXT)
+
+
+def amortization_schedule_cents(balance, interest_rate, target_payment, payments_per_year = 12,
+                                rounding = ROUND_HALF_UP):
+    """Yields a cent-exact amortization schedule using only integer arithmetic.
+
+    Interest each period is the balance times the exact periodic rate,
+    rounded to the cent with the given rounding rule; everything else is
+    whole cents, so there is no floating-point drift.
+
+    Args:
+        balance (int): the balance in cents.
+        interest_rate (float, str or Decimal): annual interest rate, between 0 and 1.
+        target_payment (int): the amount paid each period, in cents.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+        rounding (str, optional): decimal.ROUND_HALF_UP or
+            decimal.ROUND_HALF_EVEN. Defaults to ROUND_HALF_UP.
+
+    Yields:
+        SchedulePeriod: the period, payment, interest, principal and balance,
+        all amounts in cents.
+
+    Raises:
+        ValueError: the target payment does not cover the interest due.
+    """
+    numerator, denominator = periodic_rate_fraction(interest_rate, payments_per_year)
+    if balance > 0 and target_payment <= round_division(balance * numerator, denominator, rounding):
+        raise ValueError("target payment does not cover the interest due")
+    period = 0
+    while balance > 0:
+        period += 1
+        interest = round_division(balance * numerator, denominator, rounding)
+        payment = min(target_payment, balance + interest)
+        principal = payment - interest
+        balance -= principal
+        yield SchedulePeriod(period, payment, interest, principal, balance)
+
+
+def payoff_count_cents(balance, interest_rate, target_payment, payments_per_year = 12,
+                       rounding = ROUND_HALF_UP):
+    """Counts the payments of a cent-exact schedule.
+
+    Args:
+        balance (int): the balance in cents.
+        interest_rate (float, str or Decimal): annual interest rate, between 0 and 1.
+        target_payment (int): the amount paid each period, in cents.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+        rounding (str, optional): the rounding rule for interest. Defaults to ROUND_HALF_UP.
+
+    Returns:
+        int: the number of payments.
+
+    Raises:
+        ValueError: the target payment does not cover the interest due.
+    """
+    count = 0
+    for count, _ in enumerate(amortization_schedule_cents(
+            balance, interest_rate, target_payment, payments_per_year, rounding), start = 1):
+        pass
+    return count
+
+
+LOAN_COLUMNS = ('principal', 'interest_rate', 'term_years', 'payments_per_year',
+                'target_payment')
+RESULT_COLUMNS = LOAN_COLUMNS + ('min_payment', 'meets_minimum', 'payoff_count')
+# the result columns that hold dollar amounts or rates; the rest are integers
+FLOAT_COLUMNS = ('principal', 'interest_rate', 'target_payment')
+
+
+def min_payments(p, interest_rate, term_years, payments_per_year):
+    """Computes get_min_payment for whole columns of loans at once.
+
+    Args:
+        p (list or array of float): the principal of each loan.
+        interest_rate (list or array of float): the annual interest rate of each loan.
+        term_years (list or array of int): the term of each loan in years.
+        payments_per_year (list or array of int): the payments per year of each loan.
+
+    Returns:
+        list or array: the minimum payment of each loan, rounded up to a whole
+        number. Loans with a 0% rate pay the principal off evenly. A NumPy
+        array is returned when NumPy is installed.
+    """
+    if np is None:
+        return [math.ceil(pi / (t * n)) if i == 0 else get_min_payment(pi, i, t, n)
+                for pi, i, t, n in zip(p, interest_rate, term_years, payments_per_year)]
+    p, interest_rate, term_years, payments_per_year = (np.asarray(column, dtype=float) for column in
+                                                       (p, interest_rate, term_years, payments_per_year))
+    r = interest_rate / payments_per_year
+    n = term_years * payments_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (1 + r) ** n
+        a_a = np.where(r == 0, p / n, p * r * growth / (growth - 1))
+    return np.ceil(a_a)
+
+
+def _loan_results(loans):
+    """Computes the result columns for a chunk of loan rows.
+
+    Args:
+        loans (list of dict): rows read from a loan file.
+
+    Returns:
+        list of tuple: one RESULT_COLUMNS row per loan.
+    """
+    p = [float(loan['principal']) for loan in loans]
+    interest_rate = [float(loan['interest_rate']) for loan in loans]
+    term_years = [int(loan.get('term_years') or 30) for loan in loans]
+    payments_per_year = [int(loan.get('payments_per_year') or 12) for loan in loans]
+    minimum = min_payments(p, interest_rate, term_years, payments_per_year)
+    target = [float(loan['target_payment']) if loan.get('target_payment') else float(m)
+              for loan, m in zip(loans, minimum)]
+    if np is None:
+        counts = [_payoff_count_or_none(*loan) for loan in
+                  zip(p, interest_rate, target, payments_per_year)]
+    else:
+        counts = payoff_count(np.asarray(p), np.asarray(interest_rate), np.asarray(target),
+                              np.asarray(payments_per_year, dtype=float))
+    return [(pi, i, t, n, tp, int(m), int(tp >= m), int(c)) for pi, i, t, n, tp, m, c in
+            zip(p, interest_rate, term_years, payments_per_year, target, minimum, counts)]
+
+
+def _open_output(output_path):
+    """Opens output_path for writing CSV, or returns stdout if it is None."""
+    if output_path is None:
+        return nullcontext(sys.stdout)
+    return open(output_path, 'w', encoding = 'utf-8', newline = '')
+
+
+def _write_csv(chunks, output_path):
+    """Writes chunks of result rows as CSV and returns the number of rows."""
+    count = 0
+    with _open_output(output_path) as f_out:
+        writer = csv.writer(f_out)
+        writer.writerow(RESULT_COLUMNS)
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def _write_parquet(chunks, output_path):
+    """Writes chunks of result rows as Parquet, one row group per chunk, and returns the number of rows."""
+    schema = pa.schema([(name, pa.float64() if name in FLOAT_COLUMNS else pa.int64())
+                        for name in RESULT_COLUMNS])
+    count = 0
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for rows in chunks:
+            columns = [pa.array(column, type = field.type) for column, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(columns, schema = schema))
+            count += len(rows)
+    return count
+
+
+def batch(input_path, output_path = None, chunk_size = 100_000):
+    """Calculates the minimum payment and payoff count for every loan in a CSV file.
+
+    The input needs a header row with principal and interest_rate columns and
+    may also have term_years, payments_per_year and target_payment columns
+    (blank or missing values get the same defaults as main). Loans are read
+    and calculated chunk_size rows at a time, so memory use does not grow
+    with the size of the file.
+
+    Results are written as CSV unless output_path ends in .parquet, in which
+    case they are written in the columnar Parquet format, one row group per
+    chunk, with pyarrow. CSV stays the default because it needs no extra
+    package and can be streamed to stdout.
+
+    Args:
+        input_path (str): the CSV file of loans.
+        output_path (str or None): the CSV or .parquet file to write, with
+            the RESULT_COLUMNS, or None for CSV on stdout. payoff_count is -1
+            for a loan whose payment does not cover the interest.
+        chunk_size (int, optional): rows per chunk. Defaults to 100,000.
+
+    Returns:
+        int: the number of loans processed.
+
+    Raises:
+        ValueError: Parquet output was asked for and pyarrow is not installed.
+
+    Side effects:
+        Creates or overwrites the output file, or writes to stdout.
+    """
+    parquet = output_path is not None and output_path.endswith('.parquet')
+    if parquet and pa is None:
+        raise ValueError("writing Parquet output needs pyarrow")
+    with open(input_path, 'r', encoding = 'utf-8', newline = '') as f_in:
+        reader = csv.DictReader(f_in)
+        chunks = (_loan_results(chunk) for chunk in iter(lambda: list(islice(reader, chunk_size)), []))
+        if parquet:
+            return _write_parquet(chunks, output_path)
+        return _write_csv(chunks, output_path)
+
+
+GRID_COLUMNS = ('interest_rate', 'term_years', 'payments_per_year', 'min_payment',
+                'payoff_count', 'total_interest')
+
+
+@lru_cache(maxsize = 4096)
+def annuity_factor(r, n):
+    """Computes the payment per dollar borrowed for a periodic rate and number of payments.
+
+    Results are memoized in a bounded LRU cache, since a quote grid asks for
+    the same (rate, n) pairs over and over for different principals.
+
+    Args:
+        r (float): the interest rate per payment period.
+        n (int): the number of payments.
+
+    Returns:
+        float: r * (1 + r) ** n / ((1 + r) ** n - 1), or 1 / n when r is 0.
+    """
+    if r == 0:
+        return 1 / n
+    growth = (1 + r) ** n
+    return r * growth / (growth - 1)
+
+
+def payment_grid(p, rates, terms, frequencies):
+    """Evaluates payment and payoff metrics for every combination of rate, term and frequency.
+
+    Args:
+        p (float): the principal of the mortgage.
+        rates (list of float): annual interest rates between 0 and 1.
+        terms (list of int): terms in years.
+        frequencies (list of int): payments per year.
+
+    Returns:
+        list of tuple: one GRID_COLUMNS row per combination, with rates
+        varying slowest and frequencies fastest. min_payment is rounded up to
+        a whole number like get_min_payment; payoff_count and total_interest
+        are for paying exactly min_payment each period.
+    """
+    combos = [(i, t, n) for i in rates for t in terms for n in frequencies]
+    if not combos:
+        return []
+    factors = [annuity_factor(i / n, t * n) for i, t, n in combos]
+    if np is None:
+        minimum = [math.ceil(p * factor) for factor in factors]
+        rows = []
+        for (i, t, n), m in zip(combos, minimum):
+            count = payoff_count(p, i, m, n)
+            rows.append((i, t, n, m, count, _total_interest(p, i, m, count, n)))
+        return rows
+    rate = np.repeat(np.asarray(rates, dtype=float), len(terms) * len(frequencies))
+    frequency = np.tile(np.asarray(frequencies, dtype=float), len(rates) * len(terms))
+    minimum = np.ceil(p * np.asarray(factors))
+    counts = payoff_count(np.full(len(combos), float(p)), rate, minimum, frequency)
+    r = rate / frequency
+    last = balance_after_array(p, r, minimum, counts - 1)
+    interest = minimum * (counts - 1) + last * (1 + r) - p
+    return [(i, t, n, int(m), int(c), float(total)) for (i, t, n), m, c, total in
+            zip(combos, minimum, counts, interest)]
+
+
+def balance_after_array(balance, r, target_payment, k):
+    """Computes balance_after for NumPy arrays of periodic rates and payment counts.
+
+    Args:
+        balance (float or array): the starting balances.
+        r (array): interest rates per payment period.
+        target_payment (float or array): the amounts paid each period.
+        k (array): the numbers of payments made.
+
+    Returns:
+        array: the balances after k payments.
+    """
+    growth = (1 + r) ** k
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(r == 0, balance - target_payment * k,
+                        balance * growth - target_payment * (growth - 1) / r)
+
+
+def _total_interest(p, interest_rate, target_payment, count, payments_per_year):
+    """Returns the interest paid over count payments, the last of which only clears the balance."""
+    last = balance_after(p, interest_rate, target_payment, count - 1, payments_per_year)
+    final_payment = last * (1 + interest_rate / payments_per_year)
+    return target_payment * (count - 1) + final_payment - p
+
+
+def write_grid(out, rows):
+    """Writes payment_grid rows to a file as CSV.
+
+    Args:
+        out (file): where to write the CSV.
+        rows (list of tuple): rows from payment_grid.
+
+    Side effects:
+        Writes to out.
+    """
+    writer = csv.writer(out)
+    writer.writerow(GRID_COLUMNS)
+    for i, t, n, m, count, interest in rows:
+        writer.writerow((i, t, n, m, count, f"{interest:.2f}"))
+
+
+def _simulate_chunk(balance, interest_rate, target_payment, payments_per_year, rate_volatility,
+                    prepayment_rate, max_periods, seed, chunk, paths):
+    """Simulates one chunk of paths for simulate.
+
+    The chunk gets its own random stream derived from (seed, chunk), so the
+    results do not depend on how chunks are spread over processes.
+
+    Returns:
+        tuple: the payoff period of each path (0 if it was not paid off within
+        max_periods) and the interest paid on each path, as lists.
+    """
+    # chance per period that the borrower pays the whole loan off early
+    payoff_chance = 1 - (1 - prepayment_rate) ** (1 / payments_per_year)
+    shock = rate_volatility / math.sqrt(payments_per_year)
+    if np is None:
+        rng = random.Random(f"{seed}-{chunk}")
+        periods = []
+        interest_paid = []
+        for _ in range(paths):
+            path_balance = balance
+            rate = interest_rate
+            total = 0.0
+            period = 0
+            while path_balance > 0 and period < max_periods:
+                period += 1
+                interest = interest_due(path_balance, rate, payments_per_year)
+                total += interest
+                if rng.random() < payoff_chance or path_balance + interest <= target_payment:
+                    path_balance = 0.0
+                else:
+                    path_balance -= target_payment - interest
+                rate = max(rate + shock * rng.gauss(0, 1), 0.0)
+            periods.append(period if path_balance <= 0 else 0)
+            interest_paid.append(total)
+        return periods, interest_paid
+    rng = np.random.default_rng([seed, chunk])
+    path_balance = np.full(paths, float(balance))
+    rate = np.full(paths, float(interest_rate))
+    total = np.zeros(paths)
+    periods = np.zeros(paths, dtype=np.int64)
+    active = path_balance > 0
+    period = 0
+    while active.any() and period < max_periods:
+        period += 1
+        interest = np.where(active, interest_due(path_balance, rate, payments_per_year), 0.0)
+        total += interest
+        done = active & ((rng.random(paths) < payoff_chance)
+                         | (path_balance + interest <= target_payment))
+        path_balance = np.where(done, 0.0, np.where(active, path_balance - (target_payment - interest),
+                                                    path_balance))
+        periods[done] = period
+        active &= ~done
+        rate = np.maximum(rate + shock * rng.standard_normal(paths), 0.0)
+    return periods.tolist(), total.tolist()
+
+
+def simulate(balance, interest_rate, target_payment, payments_per_year = 12, paths = 10_000,
+             rate_volatility = 0.01, prepayment_rate = 0.0, max_periods = None, seed = 0,
+             workers = 1, chunk_size = 10_000):
+    """Runs a Monte Carlo simulation of a loan under a variable rate and early payoffs.
+
+    Each path starts at interest_rate and, after every payment, moves the
+    annual rate by a normal shock with an annual standard deviation of
+    rate_volatility (floored at 0). Every period the borrower may also pay the
+    whole balance off early, with a chance set by the annual prepayment rate.
+    The payment stays at target_payment, so a path whose rate rises far
+    enough may never be paid off. Paths are simulated together (vectorized
+    with NumPy when it is installed) in chunks that are spread over worker
+    processes.
+
+    Args:
+        balance (float): balance of mortgage, a positive number.
+        interest_rate (float): starting annual interest rate, between 0 and 1.
+        target_payment (float): the amount paid each period.
+        payments_per_year (int, optional): number of payments per year. Defaults to 12.
+        paths (int, optional): the number of paths to simulate. Defaults to 10,000.
+        rate_volatility (float, optional): annual standard deviation of rate
+            changes. Defaults to 0.01.
+        prepayment_rate (float, optional): the chance of paying the loan off
+            early over a year, between 0 and 1. Defaults to 0.
+        max_periods (int, optional): when to stop a path that is not paid
+            off. Defaults to 100 years of payments.
+        seed (int, optional): the random seed. The same seed and chunk_size
+            always give the same results. Defaults to 0.
+        workers (int, optional): the number of worker processes. Defaults to 1.
+        chunk_size (int, optional): the number of paths per chunk. Defaults
+            to 10,000.
+
+    Returns:
+        tuple: the payoff period of every path (0 if it was not paid off) and
+        the interest paid on every path, as lists.
+    """
+    if max_periods is None:
+        max_periods = 100 * payments_per_year
+    sizes = [min(chunk_size, paths - start) for start in range(0, paths, chunk_size)]
+    jobs = [(balance, interest_rate, target_payment, payments_per_year, rate_volatility,
+             prepayment_rate, max_periods, seed, chunk, size) for chunk, size in enumerate(sizes)]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            results = list(pool.map(_simulate_chunk, *zip(*jobs)))
+    else:
+        results = [_simulate_chunk(*job) for job in jobs]
+    periods = []
+    interest_paid = []
+    for chunk_periods, chunk_interest in results:
+        periods.extend(chunk_periods)
+        interest_paid.extend(chunk_interest)
+    return periods, interest_paid
+
+
+def summarize_simulation(periods, interest_paid):
+    """Summarizes the distributions from simulate.
+
+    Args:
+        periods (list of int): the payoff period of each path, 0 if unpaid.
+        interest_paid (list of float): the interest paid on each path.
+
+    Returns:
+        dict: the number of paths, the share not paid off, and the mean and
+        5th, 50th and 95th percentiles of the payoff period (over paths that
+        were paid off) and of the interest paid.
+    """
+    paid = sorted(period for period in periods if period)
+    interest = sorted(interest_paid)
+
+    def describe(values):
+        if not values:
+            return {"mean": None, "p5": None, "p50": None, "p95": None}
+        return {"mean": statistics.fmean(values),
+                **{f"p{q}": values[min(len(values) - 1, len(values) * q // 100)]
+                   for q in (5, 50, 95)}}
+
+    return {
+        "paths": len(periods),
+        "unpaid_share": 1 - len(paid) / len(periods) if periods else 0.0,
+        "payoff_period": describe(paid),
+        "total_interest": describe(interest),
+    }
+
+
+def main(p, interest_rate, term_years = 30, payments_per_year = 12, target_payment = None, exact = False):
     """ calculates and displays to the user what their mortgage paymet is and how many payments it will take to pay off their mortgage.
 
     Args:
@@ -70,8 +849,13 @@ def main(p, interest_rate, term_years = 30, payments_per_year = 12, target_payme
         term_years (int, optional): the term of mortgage in years, a positive integer. Defaults to 30.
         payments_per_year (int, optional): number of payments per year, positive integer. Defaults to 12.
         target_payment (float, optional): the amount a user pays per payment, a positive number or None. Defaults to None.
+        exact (bool, optional): use the minimum payment rounded up to the cent and the
+            cent-exact payoff count instead of the float ones. Defaults to False.
     """
-    minimum_payment = get_min_payment(p, interest_rate, term_years, payments_per_year)
+    if exact:
+        minimum_payment = exact_min_payment(p, interest_rate, term_years, payments_per_year)
+    else:
+        minimum_payment = get_min_payment(p, interest_rate, term_years, payments_per_year)
     print (f" This is your minimum mortgage payment per month: ${minimum_payment}")
     if target_payment == None:
         target_payment = minimum_payment
@@ -79,14 +863,19 @@ def main(p, interest_rate, term_years = 30, payments_per_year = 12, target_payme
     if target_payment < minimum_payment: 
         print("Your target payment is less than the minimum payment for this mortgage.")
     else: 
-        total_payments = remaining_payments(p, interest_rate, payments_per_year, target_payment)
+        if exact:
+            total_payments = payoff_count_cents(to_cents(p), interest_rate, to_cents(target_payment),
+                                                payments_per_year)
+        else:
+            total_payments = payoff_count(p, interest_rate, target_payment, payments_per_year)
         print(f"If you make payments of ${target_payment}, you will pay off your mortgage in {total_payments} payments!")
 
 
 def parse_args(arglist):
     """Parse and validate command-line arguments.
     
-    This function expects the following required arguments, in this order:
+    This function expects the following required arguments, in this order,
+    unless --batch is given (with --grid, only mortgage_amount is needed):
     
         mortgage_amount (float): total amount of a mortgage
         annual_interest_rate (float): the annual interest rate as a value
@@ -99,6 +888,26 @@ def parse_args(arglist):
             (default is 12)
         -p / --target_payment (float): the amount the user wants to pay per
             payment (default is the minimum payment)
+        --schedule (str): write the amortization schedule as CSV, either every
+            "period" (the default) or totals by "year"
+        --exact: use the minimum payment rounded up to the cent, and count
+            payments or write the --schedule in exact cents
+        --grid: write a CSV table of payment metrics over every combination
+            of --rates, --terms and --frequencies instead
+        --rates (float list): annual interest rates for --grid
+        --terms (int list): terms in years for --grid (default: 15 30)
+        --frequencies (int list): payments per year for --grid (default: 12)
+        --simulate (int): run a Monte Carlo simulation with this many paths
+            instead and print a JSON summary (see simulate())
+        --volatility (float): annual rate volatility for --simulate
+            (default: 0.01)
+        --prepayment (float): annual early payoff rate for --simulate
+            (default: 0)
+        --seed (int): random seed for --simulate (default: 0)
+        --workers (int): worker processes for --simulate (default: 1)
+        --batch (str): a CSV file of loans to calculate instead (see batch())
+        --output (str): where to write the --batch results, as Parquet if
+            it ends in .parquet (default is CSV on stdout)
     
     Args:
         arglist (list of str): list of command-line arguments.
@@ -112,9 +921,9 @@ def parse_args(arglist):
     """
     # set up argument parser
     parser = ArgumentParser()
-    parser.add_argument("mortgage_amount", type=float,
+    parser.add_argument("mortgage_amount", type=float, nargs="?",
                         help="the total amount of the mortgage")
-    parser.add_argument("annual_interest_rate", type=float,
+    parser.add_argument("annual_interest_rate", type=float, nargs="?",
                         help="the annual interest rate, as a float"
                              " between 0 and 1")
     parser.add_argument("-y", "--years", type=int, default=30,
@@ -124,8 +933,57 @@ def parse_args(arglist):
     parser.add_argument("-p", "--target_payment", type=float,
                         help="the amount you want to pay per payment"
                         " (default: the minimum payment)")
+    parser.add_argument("--schedule", nargs="?", const="period",
+                        choices=["period", "year"],
+                        help="write the amortization schedule as CSV, by"
+                             " period (default) or by year")
+    parser.add_argument("--exact", action="store_true",
+                        help="use the cent-exact minimum payment, payoff"
+                             " count and --schedule")
+    parser.add_argument("--grid", action="store_true",
+                        help="write payment metrics over a grid of rates,"
+                             " terms and frequencies")
+    parser.add_argument("--rates", type=float, nargs="+",
+                        help="annual interest rates for --grid")
+    parser.add_argument("--terms", type=int, nargs="+", default=[15, 30],
+                        help="terms in years for --grid (default: 15 30)")
+    parser.add_argument("--frequencies", type=int, nargs="+", default=[12],
+                        help="payments per year for --grid (default: 12)")
+    parser.add_argument("--simulate", type=int, metavar="PATHS",
+                        help="run a Monte Carlo simulation with this many paths")
+    parser.add_argument("--volatility", type=float, default=0.01,
+                        help="annual rate volatility for --simulate (default: 0.01)")
+    parser.add_argument("--prepayment", type=float, default=0.0,
+                        help="annual early payoff rate for --simulate (default: 0)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random seed for --simulate (default: 0)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes for --simulate (default: 1)")
+    parser.add_argument("--batch", metavar="CSV",
+                        help="calculate every loan in this CSV file")
+    parser.add_argument("--output",
+                        help="where to write --batch results, as Parquet if it"
+                             " ends in .parquet (default: CSV on stdout)")
     # parse and validate arguments
-    args = parser.parse_args()
+    args = parser.parse_args(arglist)
+    if args.exact and (args.batch or args.grid or args.simulate):
+        raise ValueError("--exact can not be combined with --batch, --grid or --simulate")
+    if args.batch:
+        if args.output and args.output.endswith(".parquet") and pa is None:
+            raise ValueError("--output in Parquet needs pyarrow")
+        return args
+    if args.grid:
+        if args.mortgage_amount is None or args.mortgage_amount <= 0:
+            raise ValueError("mortgage amount must be positive")
+        if not args.rates:
+            raise ValueError("--grid needs at least one rate in --rates")
+        if not all(0 <= rate <= 1 for rate in args.rates):
+            raise ValueError("annual interest rates must be between 0 and 1")
+        if min(args.terms) < 1 or min(args.frequencies) < 1:
+            raise ValueError("terms and frequencies must be positive")
+        return args
+    if args.mortgage_amount is None or args.annual_interest_rate is None:
+        raise ValueError("mortgage amount and annual interest rate are required")
     if args.mortgage_amount < 0:
         raise ValueError("mortgage amount must be positive")
     if not 0 <= args.annual_interest_rate <= 1:
@@ -136,6 +994,10 @@ def parse_args(arglist):
         raise ValueError("number of payments per year must be positive")
     if args.target_payment and args.target_payment < 0:
         raise ValueError("target payment must be positive")
+    if args.simulate is not None and args.simulate < 1:
+        raise ValueError("number of simulation paths must be positive")
+    if not 0 <= args.prepayment <= 1:
+        raise ValueError("prepayment rate must be between 0 and 1")
     
     return args
 
@@ -145,5 +1007,34 @@ if __name__ == "__main__":
         args = parse_args(sys.argv[1:])
     except ValueError as e:
         sys.exit(str(e))
+    if args.batch:
+        batch(args.batch, args.output)
+        sys.exit()
+    if args.grid:
+        write_grid(sys.stdout, payment_grid(args.mortgage_amount, args.rates,
+                                            args.terms, args.frequencies))
+        sys.exit()
+    if args.simulate:
+        target_payment = args.target_payment or get_min_payment(
+            args.mortgage_amount, args.annual_interest_rate, args.years,
+            args.num_annual_payments)
+        periods, interest_paid = simulate(
+            args.mortgage_amount, args.annual_interest_rate, target_payment,
+            args.num_annual_payments, args.simulate, args.volatility,
+            args.prepayment, seed=args.seed, workers=args.workers)
+        print(json.dumps(summarize_simulation(periods, interest_paid), indent=2))
+        sys.exit()
+    if args.schedule:
+        min_payment = exact_min_payment if args.exact else get_min_payment
+        target_payment = args.target_payment or min_payment(
+            args.mortgage_amount, args.annual_interest_rate, args.years,
+            args.num_annual_payments)
+        try:
+            write_schedule(sys.stdout, args.mortgage_amount, args.annual_interest_rate,
+                           target_payment, args.num_annual_payments,
+                           args.schedule == "year", args.exact)
+        except ValueError as e:
+            sys.exit(str(e))
+        sys.exit()
     main(args.mortgage_amount, args.annual_interest_rate, args.years,
-         args.num_annual_payments, args.target_payment)
+         args.num_annual_payments, args.target_payment, args.exact)
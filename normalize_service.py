@@ -0,0 +1,312 @@
+"""Serve phone number and address normalization from a long-running process.
+
+Clients connect over TCP or a Unix socket and send one JSON request per line:
+
+    {"id": 1, "type": "phone", "value": "1-800-FLOWERS"}
+    {"id": 2, "type": "address", "value": "123 Main St, College Park MD 20742"}
+
+and get one JSON response per line, tagged with the same id:
+
+    {"id": 1, "ok": true, "result": {"number": "8003569377", ...}}
+    {"id": 2, "ok": false, "error": "address does not match the expected format"}
+
+Requests that arrive close together, from any number of connections, are
+collected into micro-batches so phone numbers go through the batch normalizer
+together and the per-request overhead is paid once per batch.
+"""
+
+from argparse import ArgumentParser
+import asyncio
+import json
+import sys
+
+from parse_addresses import ADDRESS_FIELDS, parse_address
+from phone_numbers import PhoneNumber, normalize_numbers
+
+
+def normalize_phone_batch(values):
+    """Normalizes a batch of raw phone numbers.
+
+    Args:
+        values (list of str): the raw phone numbers.
+
+    Returns:
+        list: a (True, result dict) or (False, error message) pair per value.
+    """
+    numbers, valid = normalize_numbers(values)
+    results = []
+    for number, ok in zip(numbers, valid):
+        if ok:
+            phone_number = PhoneNumber.from_digits(f"{number:010d}")
+            results.append((True, {
+                "number": phone_number.number,
+                "area_code": phone_number.area_code,
+                "exchange_code": phone_number.exchange_code,
+                "line_number": phone_number.line_number,
+                "formatted": str(phone_number),
+            }))
+        else:
+            results.append((False, "invalid phone number"))
+    return results
+
+
+def parse_address_batch(values):
+    """Parses a batch of one-line addresses.
+
+    Args:
+        values (list of str): the addresses.
+
+    Returns:
+        list: a (True, result dict) or (False, error message) pair per value.
+    """
+    results = []
+    for value in values:
+        try:
+            address = parse_address(value)
+        except ValueError as e:
+            results.append((False, str(e)))
+            continue
+        results.append((True, {field: getattr(address, field) for field in ADDRESS_FIELDS}))
+    return results
+
+
+HANDLERS = {
+    "phone": normalize_phone_batch,
+    "address": parse_address_batch,
+}
+
+
+class Batcher:
+    """Collects values submitted one at a time and handles them in batches.
+
+    Attributes:
+        handler (callable): takes a list of values and returns one result per
+            value.
+        batch_size (int): the most values handled at once.
+        max_wait (float): the most seconds the first value of a batch waits
+            for more values to arrive.
+    """
+    def __init__(self, handler, batch_size=256, max_wait=0.005):
+        """Initializes a Batcher.
+
+        Args:
+            handler (callable): the batch handler.
+            batch_size (int, optional): the batch size cap. Defaults to 256.
+            max_wait (float, optional): the wait cap in seconds. Defaults to
+                0.005.
+        """
+        self.handler = handler
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+
+    async def submit(self, value):
+        """Queues a value and waits for its result.
+
+        Args:
+            value (str): the value to handle.
+
+        Returns:
+            the handler's result for the value.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((value, future))
+        return await future
+
+    async def run(self):
+        """Handles queued values in batches until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = self.handler([value for value, future in batch])
+            except Exception as e:
+                for value, future in batch:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                continue
+            for (value, future), result in zip(batch, results):
+                if not future.cancelled():
+                    future.set_result(result)
+
+
+class NormalizeService:
+    """Answers normalization requests from socket clients.
+
+    Attributes:
+        batchers (dict): a Batcher for each request type.
+        max_in_flight (int): the most requests from one connection being
+            answered at once; reading from the connection waits past it.
+    """
+    def __init__(self, batch_size=256, max_wait=0.005, max_in_flight=1024):
+        """Initializes a NormalizeService.
+
+        Args:
+            batch_size (int, optional): the batch size cap. Defaults to 256.
+            max_wait (float, optional): the wait cap in seconds. Defaults to
+                0.005.
+            max_in_flight (int, optional): the per-connection cap on
+                requests being answered. Defaults to 1024.
+        """
+        self.batchers = {kind: Batcher(handler, batch_size, max_wait)
+                         for kind, handler in HANDLERS.items()}
+        self.max_in_flight = max_in_flight
+
+    async def answer(self, request):
+        """Builds the response for one decoded request.
+
+        Args:
+            request (dict): the request, with type and value keys and an
+                optional id.
+
+        Returns:
+            dict: the response.
+        """
+        response = {"id": request.get("id")}
+        batcher = self.batchers.get(request.get("type"))
+        value = request.get("value")
+        if batcher is None or not isinstance(value, (str, int)):
+            response.update(ok=False, error="request needs a type of phone or"
+                            " address and a string value")
+            return response
+        ok, result = await batcher.submit(str(value))
+        if ok:
+            response.update(ok=True, result=result)
+        else:
+            response.update(ok=False, error=result)
+        return response
+
+    async def _answer_line(self, line, writer, lock):
+        """Answers one request line and writes the response line.
+
+        The response is written and drained under the connection's lock, so
+        a client that stops reading holds up its own requests instead of
+        growing the write buffer. A request whose handler raises still gets
+        an error response, so the client is not left waiting for its id.
+        """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            response = {"id": None, "ok": False, "error": f"bad request: {e}"}
+        else:
+            try:
+                response = await self.answer(request)
+            except Exception as e:
+                response = {"id": request.get("id"), "ok": False,
+                            "error": f"internal error: {e!r}"}
+        async with lock:
+            writer.write(json.dumps(response).encode('UTF-8') + b"\n")
+            await writer.drain()
+
+    async def handle_client(self, reader, writer):
+        """Reads requests from one connection until it closes.
+
+        Requests on the same connection are answered concurrently, so
+        responses can come back in a different order; use the id to match
+        them up. At most max_in_flight of them are answered at once, and the
+        next line is not read until one of them is done. A request that
+        fails, for example because the client went away before its response
+        was written, is reported on stderr.
+        """
+        tasks = set()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        lock = asyncio.Lock()
+
+        def finished(task):
+            tasks.discard(task)
+            slots.release()
+            if not task.cancelled() and task.exception() is not None:
+                print(f"request failed: {task.exception()!r}", file=sys.stderr)
+
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(self._answer_line(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(finished)
+            if tasks:
+                # failures were already reported by finished
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(self, host=None, port=None, path=None):
+        """Runs the service until cancelled.
+
+        Args:
+            host (str, optional): the TCP host to listen on.
+            port (int, optional): the TCP port to listen on.
+            path (str, optional): a Unix socket path to listen on instead.
+        """
+        runners = [asyncio.create_task(batcher.run())
+                   for batcher in self.batchers.values()]
+        if path:
+            server = await asyncio.start_unix_server(self.handle_client, path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for runner in runners:
+                runner.cancel()
+
+
+def parse_args(arglist):
+    """Parse command-line arguments.
+
+    This function allows the following optional arguments:
+
+        --host (str): the TCP host to listen on (default: 127.0.0.1)
+        --port (int): the TCP port to listen on (default: 8765)
+        --socket (str): a Unix socket path to listen on instead of TCP
+        --batch-size (int): the most requests handled at once (default: 256)
+        --max-wait (float): the most milliseconds a request waits for a
+            batch to fill (default: 5)
+        --max-in-flight (int): the most requests from one connection
+            answered at once (default: 1024)
+
+    Args:
+        arglist (list of str): command-line arguments.
+
+    Returns:
+        namespace: the parsed arguments.
+    """
+    parser = ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="TCP host to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="TCP port to listen on (default: 8765)")
+    parser.add_argument("--socket", help="Unix socket path to listen on")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="most requests handled at once (default: 256)")
+    parser.add_argument("--max-wait", type=float, default=5,
+                        help="most milliseconds a request waits for a batch"
+                             " (default: 5)")
+    parser.add_argument("--max-in-flight", type=int, default=1024,
+                        help="most requests from one connection answered at"
+                             " once (default: 1024)")
+    return parser.parse_args(arglist)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    service = NormalizeService(args.batch_size, args.max_wait / 1000,
+                               args.max_in_flight)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
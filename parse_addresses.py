@@ -1,7 +1,26 @@
 from argparse import ArgumentParser
+from array import array
+import bisect
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import heapq
+from itertools import chain
+import json
+import os
 import re
 import sys
 
+import mmap_reader
+from parse_cache import ParseCache
+
+ADDRESS_REGEX = (r"(?P<house_number>^\S+)\s(?P<street>.+)\,\s(?P<city>[\w\s]+)\s(?P<state>[A-Z]{2})\s+(?P<zip>\d{5}$)")
+ADDRESS_FIELDS = ('house_number', 'street', 'city', 'state', 'zip')
+ADDRESS_BYTES_PATTERN = mmap_reader.compile_bytes(ADDRESS_REGEX)
+# an Address is kept in a ParseCache as its address attribute and fields
+# joined by newlines, which can not appear inside a line, and a line that can
+# not be parsed as the error message alone
+CACHE_SEPARATOR = '\n'
+
 class Address: 
     """ An Address
     
@@ -25,10 +44,9 @@ class Address:
         Side effects: 
             Sets the attributes, such as house_number, street, city, state and zip by using a regular expression. 
         """
-        regex_address = (r"(?P<house_number>^\S+)\s(?P<street>.+)\,\s(?P<city>[\w\s]+)\s(?P<state>[A-Z]{2})\s+(?P<zip>\d{5}$)")
-        match = re.search(regex_address, address)
+        match = re.search(ADDRESS_REGEX, address)
         if match is None: 
-            raise ValueError
+            raise ValueError("address does not match the expected format")
         else:
             self.address = match[0]
             self.house_number = match.group('house_number')
@@ -36,6 +54,30 @@ class Address:
             self.city = match.group('city')
             self.state = match.group('state')
             self.zip = match.group('zip')
+    
+    @classmethod
+    def from_fields(cls, house_number, street, city, state, zip):
+        """Builds an Address from fields that have already been parsed.
+
+        Args:
+            house_number (str): the house number of the address.
+            street (str): the street name.
+            city (str): the city.
+            state (str): the state.
+            zip (str): the zip code.
+
+        Returns:
+            Address: an address whose address attribute is rebuilt from the
+            fields in the standard one-line form.
+        """
+        address = cls.__new__(cls)
+        address.address = f"{house_number} {street}, {city} {state} {zip}"
+        address.house_number = house_number
+        address.street = street
+        address.city = city
+        address.state = state
+        address.zip = zip
+        return address
         
     def __repr__(self):
         """Return a formal representation of the Address object."""
@@ -48,17 +90,677 @@ class Address:
             f"zip:          {self.zip}"
          )
 
-def read_addresses(filepath):
+class _StringColumn:
+    """A column of strings kept as one UTF-8 blob and an array of offsets.
+
+    A list of short str objects costs about 60 bytes per row, where the
+    blob and offsets cost the encoded length plus 4 bytes. Strings are
+    decoded as they are read.
+    """
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets = array('I', [0])
+
+    def append(self, value):
+        """Adds a string to the end of the column."""
+        self.blob += value.encode('UTF-8')
+        self.offsets.append(len(self.blob))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        offsets = self.offsets
+        if index < 0:
+            index += len(offsets) - 1
+            if index < 0:
+                raise IndexError("column index out of range")
+        # offsets[index + 1] raises IndexError past the end
+        return self.blob[offsets[index]:offsets[index + 1]].decode('UTF-8')
+
+    def __iter__(self):
+        offsets = self.offsets
+        text = self.blob.decode('UTF-8')
+        if len(text) != len(self.blob):
+            # byte offsets only index the decoded text when it is all ASCII
+            for i in range(len(self)):
+                yield self[i]
+            return
+        for start, end in zip(offsets, offsets[1:]):
+            yield text[start:end]
+
+
+class AddressTable:
+    """A compact, column-oriented collection of parsed addresses.
+
+    Instead of one Address object per row, each field is kept in its own
+    column. States, cities and streets repeat a lot, so they are dictionary
+    encoded: the column holds small integer codes into a list of distinct
+    values. Zip codes are stored as integers, and house numbers as one UTF-8
+    blob with an array of offsets. Address objects are only built when a row
+    is asked for. The full address line is rebuilt from the fields, and is
+    only stored for the rows whose line is not in that standard form, such
+    as a line with extra spaces before the zip code. In the same way, a zip
+    code written with digits other than ASCII ones, which the address
+    regex also accepts, is stored as written next to its integer.
+
+    Attributes:
+        house_numbers (_StringColumn): the house number of each row.
+        streets (array): codes into the street values, one per row.
+        cities (array): codes into the city values, one per row.
+        states (array): codes into the state values, one per row.
+        zips (array): the zip code of each row as an integer, by which
+            zip codes are looked up and sorted.
+    """
+    COLUMNS = ('house_number', 'street', 'city', 'state', 'zip')
+
+    def __init__(self, addresses = ()):
+        """Initializes an AddressTable, optionally filled from addresses.
+
+        Args:
+            addresses (iterable of Address, optional): addresses to add.
+                Defaults to an empty table.
+
+        Side effects:
+            Sets the column attributes and the value dictionaries.
+        """
+        self.house_numbers = _StringColumn()
+        self.streets = array('I')
+        self.cities = array('I')
+        self.states = array('H')
+        self.zips = array('I')
+        self._values = {'street': [], 'city': [], 'state': []}
+        self._codes = {'street': {}, 'city': {}, 'state': {}}
+        self._lines = {}
+        self._zip_text = {}
+        self.extend(addresses)
+
+    @classmethod
+    def from_file(cls, filepath, rejects = None):
+        """Reads a file of addresses straight into a table.
+
+        Args:
+            filepath (str): a path to a file that contains one address per line.
+            rejects (list, optional): passed on to iter_addresses. Defaults
+                to None.
+
+        Returns:
+            AddressTable: a table with one row per parsed line.
+        """
+        return cls(iter_addresses(filepath, rejects))
+
+    def _encode(self, column, value):
+        """Returns the code for a value, adding it to the dictionary if new."""
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._values[column])
+            self._values[column].append(value)
+        return code
+
+    def append(self, address):
+        """Adds one address to the end of the table.
+
+        Args:
+            address (Address): the address to add.
+
+        Side effects:
+            Appends to every column.
+        """
+        self.house_numbers.append(address.house_number)
+        self.streets.append(self._encode('street', address.street))
+        self.cities.append(self._encode('city', address.city))
+        self.states.append(self._encode('state', address.state))
+        self.zips.append(int(address.zip))
+        if not address.zip.isascii():
+            # int() reads any decimal digits, so these are kept as written
+            self._zip_text[len(self.zips) - 1] = address.zip
+        if address.address != (f"{address.house_number} {address.street},"
+                               f" {address.city} {address.state} {address.zip}"):
+            self._lines[len(self.zips) - 1] = address.address
+
+    def extend(self, addresses):
+        """Adds every address from an iterable to the end of the table.
+
+        Args:
+            addresses (iterable of Address): the addresses to add.
+
+        Side effects:
+            Appends to every column.
+        """
+        for address in addresses:
+            self.append(address)
+
+    def row(self, index):
+        """Returns the fields of one row.
+
+        Args:
+            index (int): the row number.
+
+        Returns:
+            tuple of str: house_number, street, city, state and zip.
+        """
+        zip_code = f"{self.zips[index]:05d}"
+        if self._zip_text:
+            zip_code = self._zip_text.get(index % len(self), zip_code)
+        return (
+            self.house_numbers[index],
+            self._values['street'][self.streets[index]],
+            self._values['city'][self.cities[index]],
+            self._values['state'][self.states[index]],
+            zip_code,
+        )
+
+    def rows(self):
+        """Yields the fields of every row in order, without building Address objects."""
+        streets = self._values['street']
+        cities = self._values['city']
+        states = self._values['state']
+        zip_text = self._zip_text
+        for index, (house_number, street, city, state, zip_code) in enumerate(zip(
+                self.house_numbers, self.streets, self.cities, self.states, self.zips)):
+            zip_code = f"{zip_code:05d}"
+            if zip_text:
+                zip_code = zip_text.get(index, zip_code)
+            yield (house_number, streets[street], cities[city], states[state], zip_code)
+
+    def __len__(self):
+        """Returns the number of rows in the table."""
+        return len(self.house_numbers)
+
+    def __getitem__(self, index):
+        """Returns an Address view of one row.
+
+        Args:
+            index (int): the row number.
+
+        Returns:
+            Address: a new Address built from the row, with the same address
+            line as the Address that was added.
+        """
+        address = Address.from_fields(*self.row(index))
+        if self._lines:
+            address.address = self._lines.get(index % len(self), address.address)
+        return address
+
+    def __iter__(self):
+        """Yields an Address view of every row in order."""
+        lines = self._lines
+        for index, fields in enumerate(self.rows()):
+            address = Address.from_fields(*fields)
+            if index in lines:
+                address.address = lines[index]
+            yield address
+
+    def to_csv(self, filepath):
+        """Writes the table to a CSV file with a header row.
+
+        Args:
+            filepath (str): the path of the CSV file.
+
+        Side effects:
+            Creates or overwrites the file.
+        """
+        with open(filepath, 'w', encoding = 'UTF-8', newline = '') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.COLUMNS)
+            writer.writerows(self.rows())
+
+    def to_jsonl(self, filepath):
+        """Writes the table to a JSON Lines file, one object per row.
+
+        Args:
+            filepath (str): the path of the JSON Lines file.
+
+        Side effects:
+            Creates or overwrites the file.
+        """
+        with open(filepath, 'w', encoding = 'UTF-8') as f:
+            for fields in self.rows():
+                f.write(json.dumps(dict(zip(self.COLUMNS, fields))) + "\n")
+
+class AddressIndex:
+    """Lookup indexes over a table of parsed addresses.
+
+    Hash indexes map a zip code, a state, or a (city, state) pair to the row
+    numbers that have it. A sorted index of (zip, row) pairs answers zip
+    range and prefix queries; it is only re-sorted when a range query comes
+    in after new rows were added, so the index can be filled while streaming.
+
+    Attributes:
+        table (AddressTable): the indexed addresses.
+    """
+    def __init__(self, addresses = ()):
+        """Initializes an AddressIndex, optionally filled from addresses.
+
+        Args:
+            addresses (iterable of Address, optional): addresses to add.
+                Defaults to an empty index.
+
+        Side effects:
+            Sets the table attribute and the empty indexes.
+        """
+        self.table = AddressTable()
+        self._by_zip = {}
+        self._by_state = {}
+        self._by_city = {}
+        self._sorted_zips = []
+        self._sorted_rows = []
+        self._unsorted = []
+        self.extend(addresses)
+
+    def add(self, address):
+        """Adds one address to the table and to every index.
+
+        Args:
+            address (Address): the address to add.
+
+        Returns:
+            int: the row number of the new address.
+
+        Side effects:
+            Appends to the table and the indexes.
+        """
+        row = len(self.table)
+        self.table.append(address)
+        zip_code = self.table.zips[row]
+        self._by_zip.setdefault(zip_code, []).append(row)
+        self._by_state.setdefault(address.state, []).append(row)
+        self._by_city.setdefault((address.city, address.state), []).append(row)
+        self._unsorted.append((zip_code, row))
+        return row
+
+    def extend(self, addresses):
+        """Adds every address from an iterable to the index.
+
+        Args:
+            addresses (iterable of Address): the addresses to add.
+
+        Side effects:
+            Appends to the table and the indexes.
+        """
+        for address in addresses:
+            self.add(address)
+
+    def __len__(self):
+        """Returns the number of indexed addresses."""
+        return len(self.table)
+
+    def _rows_to_addresses(self, rows):
+        """Returns an Address view for each row number."""
+        return [self.table[row] for row in rows]
+
+    def by_zip(self, zip_code):
+        """Returns the addresses in a zip code.
+
+        Args:
+            zip_code (str or int): the zip code to look up.
+
+        Returns:
+            list of Address: the matching addresses in input order.
+        """
+        return self._rows_to_addresses(self._by_zip.get(int(zip_code), []))
+
+    def by_state(self, state):
+        """Returns the addresses in a state.
+
+        Args:
+            state (str): the two-letter state to look up.
+
+        Returns:
+            list of Address: the matching addresses in input order.
+        """
+        return self._rows_to_addresses(self._by_state.get(state, []))
+
+    def by_city(self, city, state):
+        """Returns the addresses in a city.
+
+        Args:
+            city (str): the city to look up.
+            state (str): the state the city is in.
+
+        Returns:
+            list of Address: the matching addresses in input order.
+        """
+        return self._rows_to_addresses(self._by_city.get((city, state), []))
+
+    def _sort(self):
+        """Merges rows added since the last range query into the sorted index."""
+        if self._unsorted:
+            merged = list(heapq.merge(zip(self._sorted_zips, self._sorted_rows),
+                                      sorted(self._unsorted)))
+            self._sorted_zips = [zip_code for zip_code, row in merged]
+            self._sorted_rows = [row for zip_code, row in merged]
+            self._unsorted = []
+
+    def zip_range(self, low, high):
+        """Returns the addresses whose zip code is between low and high.
+
+        Args:
+            low (str or int): the smallest zip code to include.
+            high (str or int): the largest zip code to include.
+
+        Returns:
+            list of Address: the matching addresses ordered by zip code.
+        """
+        self._sort()
+        start = bisect.bisect_left(self._sorted_zips, int(low))
+        end = bisect.bisect_right(self._sorted_zips, int(high))
+        return self._rows_to_addresses(self._sorted_rows[start:end])
+
+    def zip_prefix(self, prefix):
+        """Returns the addresses whose zip code starts with prefix.
+
+        Args:
+            prefix (str): one to five leading digits of a zip code.
+
+        Returns:
+            list of Address: the matching addresses ordered by zip code.
+
+        Raises:
+            ValueError: prefix is not one to five digits.
+        """
+        if not re.fullmatch(r"\d{1,5}", prefix):
+            raise ValueError("zip prefix must be one to five digits")
+        scale = 10 ** (5 - len(prefix))
+        low = int(prefix) * scale
+        return self.zip_range(low, low + scale - 1)
+
+def read_addresses(filepath, use_mmap = False, cache = None):
     """Creates and converts each line to a list of addresses objects. 
 
     Args:
         filepath (str): a path to a file that contains one address per line.
+        use_mmap (bool, optional): read the file through a memory map. 
+            Defaults to False.
+        cache (ParseCache, optional): a cache of earlier parse results.
+            Defaults to None.
 
     Returns:
         a list with one instance of Address objects. 
     """
+    return list(iter_addresses(filepath, use_mmap = use_mmap, cache = cache))
+
+def parse_address(line):
+    """Parses one line into an Address.
+
+    Args:
+        line (str): a one line address.
+
+    Returns:
+        Address: the parsed address.
+
+    Raises:
+        ValueError: The address string can not be parsed.
+    """
+    return Address(line)
+
+def _address_result(line):
+    """Parses a line into the form kept in a ParseCache.
+
+    Args:
+        line (bytes): a one line address, as read in binary mode, without its
+            newline.
+
+    Returns:
+        str: the matched text and the fields separated by CACHE_SEPARATOR, or
+        the error message if the line can not be parsed.
+    """
+    try:
+        address = Address(line.decode('UTF-8').rstrip('\r\n'))
+    except ValueError as e:
+        return str(e)
+    return CACHE_SEPARATOR.join([address.address] + [getattr(address, field) for field in ADDRESS_FIELDS])
+
+def _iter_addresses_cached(filepath, rejects, cache):
+    """Does the work of iter_addresses when a cache is given."""
+    new = Address.__new__
+    with open(filepath, 'rb') as f: 
+        for line_number, (line, result) in enumerate(cache.results(f, _address_result), start = 1):
+            if CACHE_SEPARATOR not in result:
+                if rejects is None:
+                    raise ValueError(result)
+                rejects.append((line_number, line.decode('UTF-8').rstrip('\r\n'), result))
+                continue
+            address = new(Address)
+            (address.address, address.house_number, address.street, address.city,
+             address.state, address.zip) = result.split(CACHE_SEPARATOR)
+            yield address
+
+def iter_addresses(filepath, rejects = None, use_mmap = False, cache = None):
+    """Lazily reads a file of addresses, yielding one Address at a time.
+
+    Only the current line is held in memory, so this works on files of any
+    size and the first address is available as soon as it is read.
+
+    Args:
+        filepath (str): a path to a file that contains one address per line.
+        rejects (list, optional): if given, lines that can not be parsed are
+            appended to it as (line number, line, reason) tuples and skipped
+            instead of raising. Defaults to None.
+        use_mmap (bool, optional): scan the file through a memory map and
+            decode only the matched fields. Not used together with cache.
+            Defaults to False.
+        cache (ParseCache, optional): a cache of earlier parse results.
+            Defaults to None.
+
+    Yields:
+        Address: the parsed address for each line of the file.
+
+    Raises:
+        ValueError: a line of the file can not be parsed and rejects is None.
+    """
+    if cache is not None:
+        yield from _iter_addresses_cached(filepath, rejects, cache)
+        return
+    if use_mmap:
+        yield from _iter_addresses_mmap(filepath, rejects)
+        return
     with open(filepath, 'r', encoding = 'UTF-8') as f: 
-            addresses = [Address(line) for line in f]
+        for line_number, line in enumerate(f, start = 1):
+            try:
+                address = Address(line)
+            except ValueError as e:
+                if rejects is None:
+                    raise
+                rejects.append((line_number, line.rstrip('\n'), str(e)))
+                continue
+            yield address
+
+def _iter_addresses_mmap(filepath, rejects):
+    """Does the work of iter_addresses when use_mmap is True.
+
+    The map is read a block of lines at a time. The bytes version of the
+    address regex finds the fields of every line of a block in one call, and
+    the lines and then all of their fields are each decoded in one call,
+    instead of decoding every field of every line on its own. The bytes regex
+    only knows ASCII letters and spaces, so a block that match_block turns
+    down, for a line it can not match or a byte it would class differently,
+    is decoded and given to Address a line at a time, to get exactly the
+    same result as the text reader.
+    """
+    new = Address.__new__
+    line_number = 0
+    with mmap_reader.open_mmap(filepath) as buf:
+        for block in mmap_reader.iter_blocks(buf):
+            rows = mmap_reader.match_block(block, ADDRESS_BYTES_PATTERN)
+            lines = block.decode('UTF-8').split('\n')
+            if rows is not None:
+                # a line holds no newline, so none of its fields can
+                fields = iter(b'\n'.join(chain.from_iterable(rows)).decode('UTF-8').split('\n'))
+                for line, house_number, street, city, state, zip_code in zip(lines, fields, fields, fields, fields, fields):
+                    address = new(Address)
+                    address.address = line
+                    address.house_number = house_number
+                    address.street = street
+                    address.city = city
+                    address.state = state
+                    address.zip = zip_code
+                    yield address
+                line_number += len(lines)
+                continue
+            for line in lines:
+                line_number += 1
+                line = line.removesuffix('\r')
+                try:
+                    address = Address(line)
+                except ValueError as e:
+                    if rejects is None:
+                        raise
+                    rejects.append((line_number, line, str(e)))
+                    continue
+                yield address
+
+def read_addresses_tolerant(filepath, report = None):
+    """Parses every address it can, setting aside lines that can not be parsed.
+
+    Args:
+        filepath (str): a path to a file that contains one address per line.
+        report (str, optional): a path to write the rejected lines to, one
+            tab-separated line number, reason and line per row. Defaults to
+            None, which writes no report.
+
+    Returns:
+        tuple: the list of Address objects, the number of parsed lines and
+        the number of rejected lines.
+
+    Side effects:
+        Writes the report file when report is given.
+    """
+    rejects = []
+    addresses = list(iter_addresses(filepath, rejects))
+    if report is not None:
+        write_rejects(rejects, report)
+    return addresses, len(addresses), len(rejects)
+
+def write_rejects(rejects, report):
+    """Writes rejected lines to a tab-separated report file.
+
+    Args:
+        rejects (list of tuple): (line number, line, reason) tuples.
+        report (str): a path to the report file.
+
+    Side effects:
+        Creates or overwrites the report file.
+    """
+    with open(report, 'w', encoding = 'UTF-8') as f:
+        for line_number, line, reason in rejects:
+            f.write(f"{line_number}\t{reason}\t{line}\n")
+
+def chunk_offsets(filepath, chunks):
+    """Splits a file into byte ranges that start and end on line boundaries.
+
+    Args:
+        filepath (str): a path to a file that contains one address per line.
+        chunks (int): the number of ranges to aim for, a positive integer.
+
+    Returns:
+        list of tuple: (start, end) byte offsets, in file order. Fewer than
+        chunks ranges are returned when the file has too few lines.
+    """
+    size = os.path.getsize(filepath)
+    step = max(size // chunks, 1)
+    offsets = []
+    with open(filepath, 'rb') as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + step, size))
+            f.readline()
+            end = min(f.tell(), size)
+            offsets.append((start, end))
+            start = end
+    return offsets
+
+def parse_chunk(filepath, start, end):
+    """Parses the addresses found in one byte range of a file.
+
+    Args:
+        filepath (str): a path to a file that contains one address per line.
+        start (int): the offset of the first byte of the range.
+        end (int): the offset just past the last byte of the range.
+
+    Returns:
+        list: Address objects for each line in the range, in file order.
+
+    Raises:
+        ValueError: a line in the range can not be parsed.
+    """
+    return _addresses_from_columns(_parse_chunk_columns(filepath, start, end))
+
+def _parse_chunk_columns(filepath, start, end):
+    """Does the work of parse_chunk, returning the fields as columns.
+
+    A worker process sends its results back pickled. Six lists of strings
+    pickle in a fraction of the time and space of one Address object per
+    line, each with its own attribute dictionary.
+
+    Returns:
+        tuple of list: the address lines, then one list per ADDRESS_FIELDS
+        field, in file order.
+    """
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).decode('UTF-8').split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    columns = ([], [], [], [], [], [])
+    appends = [column.append for column in columns]
+    search = re.compile(ADDRESS_REGEX).search
+    for line in lines:
+        # a Windows line ending leaves its carriage return on the line, which
+        # text mode would have removed
+        match = search(line.removesuffix('\r'))
+        if match is None:
+            raise ValueError("address does not match the expected format")
+        for append, value in zip(appends, match.group(0, *ADDRESS_FIELDS)):
+            append(value)
+    return columns
+
+def _addresses_from_columns(columns):
+    """Builds Address objects from the columns of _parse_chunk_columns."""
+    new = Address.__new__
+    addresses = []
+    for line, house_number, street, city, state, zip_code in zip(*columns):
+        address = new(Address)
+        address.address = line
+        address.house_number = house_number
+        address.street = street
+        address.city = city
+        address.state = state
+        address.zip = zip_code
+        addresses.append(address)
+    return addresses
+
+def read_addresses_parallel(filepath, workers = None, chunks_per_worker = 4):
+    """Parses a file of addresses across a pool of worker processes.
+
+    The file is split into byte ranges on line boundaries and each range is
+    parsed by one worker, which sends back the fields as columns. Address
+    objects are built from them in this process, in input order.
+
+    Args:
+        filepath (str): a path to a file that contains one address per line.
+        workers (int, optional): the number of worker processes. Defaults to
+            the number of CPUs.
+        chunks_per_worker (int, optional): how many ranges to hand each
+            worker, which evens out the load. Defaults to 4.
+
+    Returns:
+        a list with one instance of Address objects per line, in file order.
+
+    Raises:
+        ValueError: a line of the file can not be parsed.
+    """
+    workers = workers or os.cpu_count() or 1
+    offsets = chunk_offsets(filepath, workers * chunks_per_worker)
+    if not offsets:
+        return []
+    starts = [start for start, end in offsets]
+    ends = [end for start, end in offsets]
+    addresses = []
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        for columns in pool.map(_parse_chunk_columns, [filepath] * len(offsets), starts, ends):
+            addresses.extend(_addresses_from_columns(columns))
     return addresses
 
 def parse_args(arglist):
@@ -66,19 +768,111 @@ def parse_args(arglist):
     
     Expect one mandatory argument, the path to a file of addresses.
     
+    This function also allows the following optional arguments:
+    
+        --stream: print each address as soon as it is parsed instead of
+            reading the whole file first (can not be combined with --workers)
+        --workers (int): parse the file across this many worker processes
+        --mmap: read the file through a memory map (can not be combined
+            with --workers)
+        --cache (str): keep parse results in this directory and reuse them
+            on later runs (can not be combined with --workers)
+        --rejects (str): skip lines that can not be parsed and write them to
+            this report file (can not be combined with --workers)
+        --zip (str): only print addresses in this zip code
+        --zip-prefix (str): only print addresses whose zip starts with this
+        --zip-range (str, str): only print addresses with a zip between these
+        --state (str): only print addresses in this state
+        --city (str): only print addresses in this city (requires --state)
+    
     Args:
         arglist (list of str): command-line arguments.
     
     Returns:
-        namespace: an object with one attribute, file, containing a string.
+        namespace: an object with the attributes file (str), stream (bool),
+        workers (int or None), mmap (bool), cache (str or None), rejects (str or None) and the query
+        attributes zip, zip_prefix, zip_range, state and city (None when
+        not given).
     """
     parser = ArgumentParser()
     parser.add_argument("file", help="file containing one address per line")
-    return parser.parse_args(arglist)
+    parser.add_argument("--stream", action="store_true",
+                        help="print addresses as they are parsed")
+    parser.add_argument("--workers", type=int,
+                        help="number of worker processes to parse with")
+    parser.add_argument("--mmap", action="store_true",
+                        help="read the file through a memory map")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="directory of cached parse results to reuse")
+    parser.add_argument("--rejects",
+                        help="skip bad lines and write them to this report")
+    query = parser.add_mutually_exclusive_group()
+    query.add_argument("--zip", help="only print addresses in this zip code")
+    query.add_argument("--zip-prefix",
+                       help="only print addresses whose zip starts with this")
+    query.add_argument("--zip-range", nargs=2, metavar=("LOW", "HIGH"),
+                       help="only print addresses with a zip in this range")
+    parser.add_argument("--state", help="only print addresses in this state")
+    parser.add_argument("--city",
+                        help="only print addresses in this city (needs --state)")
+    args = parser.parse_args(arglist)
+    if args.workers:
+        for option in ("stream", "mmap", "cache", "rejects"):
+            if getattr(args, option):
+                parser.error(f"--{option} can not be combined with --workers")
+    if args.city and not args.state:
+        parser.error("--city requires --state")
+    if args.state and (args.zip or args.zip_prefix or args.zip_range):
+        parser.error("--state and --city can not be combined with zip queries")
+    return args
+
+def query_index(index, args):
+    """Runs the query given on the command line against an index.
+
+    Args:
+        index (AddressIndex): the parsed addresses.
+        args (namespace): the parsed command-line arguments.
+
+    Returns:
+        list of Address: the matching addresses.
+    """
+    if args.zip:
+        return index.by_zip(args.zip)
+    if args.zip_prefix:
+        return index.zip_prefix(args.zip_prefix)
+    if args.zip_range:
+        return index.zip_range(*args.zip_range)
+    if args.city:
+        return index.by_city(args.city, args.state)
+    return index.by_state(args.state)
 
 if __name__ == "__main__":
     args = parse_args(sys.argv[1:])
-    for address in read_addresses(args.file):
+    rejects = [] if args.rejects else None
+    cache = ParseCache(args.cache, "address") if args.cache else None
+    if args.workers:
+        addresses = read_addresses_parallel(args.file, args.workers)
+    elif args.stream or args.rejects:
+        addresses = iter_addresses(args.file, rejects, args.mmap, cache)
+    else:
+        addresses = read_addresses(args.file, args.mmap, cache)
+    if args.zip or args.zip_prefix or args.zip_range or args.state:
+        index = AddressIndex(addresses)
+        addresses = query_index(index, args)
+        parsed = len(index)
+    else:
+        parsed = None
+    count = 0
+    for address in addresses:
         # the !r tells the f-string to use the __repr__() method to generate
         # a string version of the address object
-        print(f"{address!r}\n")
\ No newline at end of file
+        print(f"{address!r}\n")
+        count += 1
+    if parsed is None:
+        parsed = count
+    if rejects is not None:
+        write_rejects(rejects, args.rejects)
+        print(f"parsed {parsed}, rejected {len(rejects)}", file=sys.stderr)
+    if cache is not None:
+        print(cache.stats(), file=sys.stderr)
+        cache.close()
\ No newline at end of file
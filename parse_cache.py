@@ -0,0 +1,261 @@
+"""Keep parse results on disk so unchanged input lines are not parsed again.
+
+Results are stored in a SQLite database in a cache directory, keyed by a
+fixed-size hash of each line's bytes, so the input text itself is not kept.
+Looking a line up in SQLite costs about as much as parsing a short line, so
+results are stored a batch at a time: each row of the database is one page
+holding the keys of a batch in one blob and their results joined into one
+string. The first lookup reads every page into a dictionary, and each batch
+of keys is then looked up with one C-level map over the dictionary. Each
+batch of new results is written and committed as one page as soon as it is
+parsed.
+
+Pages are stamped with the run that last used any of their lines, and
+whenever a new page takes the cache past its size cap the pages that were
+used longest ago are evicted in the same commit, so lines are kept or
+evicted a page at a time and the cache, on disk and in memory, stays within
+the cap during a run and after a crash.
+"""
+
+from hashlib import blake2b
+from itertools import compress, islice, repeat
+import os
+import sqlite3
+
+# joins the results of a page; a result that contains it is not cached
+RESULT_SEPARATOR = '\0'
+# bytes in the hash of a line that results are stored under
+KEY_SIZE = 16
+# bumped when the table layout changes; older tables are dropped
+SCHEMA_VERSION = 3
+
+
+def line_keys(lines):
+    """Returns the keys the results of some lines are stored under.
+
+    Args:
+        lines (iterable of bytes): input lines, without their newlines.
+
+    Returns:
+        list of bytes: a KEY_SIZE-byte hash of each line.
+    """
+    return [blake2b(line, digest_size=KEY_SIZE).digest() for line in lines]
+
+
+class ParseCache:
+    """An on-disk cache of parse results with least-recently-used eviction.
+
+    Attributes:
+        path (str): the path of the SQLite database file.
+        max_entries (int): the most entries kept; a new page past it evicts
+            the pages used longest ago.
+        batch_size (int): how many lines are looked up, parsed and committed
+            together, and so the most lines in a page.
+        hits (int): the number of lookups that found an entry.
+        misses (int): the number of lookups that did not.
+    """
+    def __init__(self, directory, namespace, max_entries=1_000_000, batch_size=10_000):
+        """Opens or creates a cache.
+
+        Args:
+            directory (str): the cache directory, created if missing.
+            namespace (str): the kind of result stored, e.g. "address". Each
+                namespace gets its own database file.
+            max_entries (int, optional): the size cap. Defaults to 1,000,000.
+            batch_size (int, optional): lines looked up and committed
+                together. Defaults to 10,000.
+
+        Side effects:
+            Creates the directory and the database file if needed.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{namespace}.sqlite")
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(self.path)
+        # in WAL mode a commit only waits for a sync at checkpoints, and a
+        # power cut can lose the last pages but not corrupt the file
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.executescript("DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS pages;"
+                                   f" PRAGMA user_version = {SCHEMA_VERSION};")
+        self._db.execute("CREATE TABLE IF NOT EXISTS pages (id INTEGER PRIMARY KEY,"
+                         " keys BLOB, results TEXT, size INTEGER, last_used INTEGER)")
+        row = self._db.execute("SELECT MAX(last_used), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        self._stamp = (row[0] or 0) + 1
+        self._size = row[1]
+        self._entries = None
+        self._pages = None
+        self._used = set()
+        # a cache left larger by a bigger cap is cut down before it is read
+        self._evict()
+        self._db.commit()
+
+    @staticmethod
+    def _split_keys(keys):
+        """Splits the keys blob of a page into its keys."""
+        return [keys[start:start + KEY_SIZE] for start in range(0, len(keys), KEY_SIZE)]
+
+    def _load(self):
+        """Reads every page into the dictionaries of results and page ids."""
+        self._entries = entries = {}
+        self._pages = pages = {}
+        for page, keys, results in self._db.execute(
+                "SELECT id, keys, results FROM pages ORDER BY id"):
+            keys = self._split_keys(keys)
+            entries.update(zip(keys, results.split(RESULT_SEPARATOR)))
+            pages.update(zip(keys, repeat(page)))
+
+    def _stamp_used(self):
+        """Stamps the pages used so far in this run with the run's stamp."""
+        self._used.discard(None)
+        self._db.executemany("UPDATE pages SET last_used = ? WHERE id = ?",
+                             zip(repeat(self._stamp), self._used))
+        self._used.clear()
+
+    def _evict(self):
+        """Deletes the pages used longest ago until the cache is within its cap."""
+        excess = self._size - self.max_entries
+        if excess <= 0:
+            return
+        self._stamp_used()
+        evict = []
+        for page, size in self._db.execute("SELECT id, size FROM pages ORDER BY last_used, id"):
+            if excess <= 0:
+                break
+            evict.append((page, size))
+            excess -= size
+        for page, size in evict:
+            if self._entries is not None:
+                keys = self._db.execute("SELECT keys FROM pages WHERE id = ?", (page,)).fetchone()[0]
+                for key in self._split_keys(keys):
+                    # a key parsed again after an earlier eviction is in a newer page
+                    if self._pages.get(key) == page:
+                        del self._entries[key]
+                        del self._pages[key]
+            self._db.execute("DELETE FROM pages WHERE id = ?", (page,))
+            self._size -= size
+
+    def get_many(self, lines):
+        """Looks up the results stored for a batch of lines.
+
+        Args:
+            lines (list of bytes): the input lines, without their newlines.
+
+        Returns:
+            list: the result stored for each line, or None where the line is
+            not cached.
+
+        Side effects:
+            Reads the cache into memory on first use, notes the pages of the
+            lines found as used in this run, and updates the hit and miss
+            counts.
+        """
+        if self._entries is None:
+            self._load()
+        keys = line_keys(lines)
+        values = list(map(self._entries.get, keys))
+        misses = values.count(None)
+        self.hits += len(values) - misses
+        self.misses += misses
+        self._used.update(map(self._pages.get, keys))
+        return values
+
+    def put_many(self, entries):
+        """Stores a batch of results as one page and commits it.
+
+        Args:
+            entries (dict): each input line (bytes, without its newline)
+                mapped to its result (str).
+
+        Side effects:
+            Writes to the database, evicting the pages used longest ago if
+            the new page takes the cache past its cap.
+        """
+        if self._entries is None:
+            self._load()
+        keep = [RESULT_SEPARATOR not in result for result in entries.values()]
+        keys = line_keys(compress(entries, keep))
+        if keys:
+            results = list(compress(entries.values(), keep))
+            page = self._db.execute("INSERT INTO pages (keys, results, size, last_used)"
+                                    " VALUES (?, ?, ?, ?)",
+                                    (b''.join(keys), RESULT_SEPARATOR.join(results),
+                                     len(keys), self._stamp)).lastrowid
+            self._entries.update(zip(keys, results))
+            self._pages.update(zip(keys, repeat(page)))
+            self._size += len(keys)
+            self._evict()
+            self._db.commit()
+
+    def results(self, lines, parse):
+        """Yields every line with its result, parsing only the lines not cached.
+
+        New results are committed a batch at a time, before any result of
+        the batch is yielded, so work already done survives an error in parse
+        or in the consumer.
+
+        Args:
+            lines (iterable of bytes): the lines of a file opened in binary
+                mode, each ending in a newline except perhaps the last.
+            parse (callable): returns the result, a str, for a line (bytes,
+                without its newline) that is not cached.
+
+        Yields:
+            tuple: each line, without its newline, and its cached or newly
+            parsed result, in order.
+        """
+        lines = iter(lines)
+        while batch := b''.join(islice(lines, self.batch_size)):
+            # splitting the joined batch strips every newline in one call
+            batch = batch.split(b'\n')
+            if not batch[-1]:
+                batch.pop()
+            results = self.get_many(batch)
+            new = {}
+            try:
+                if None in results:
+                    for i, result in enumerate(results):
+                        if result is None:
+                            results[i] = new[batch[i]] = parse(batch[i])
+            finally:
+                self.put_many(new)
+            yield from zip(batch, results)
+
+    def __len__(self):
+        """Returns the number of entries in the cache."""
+        return self._size
+
+    def stats(self):
+        """Returns a one-line summary of hits and misses.
+
+        Returns:
+            str: the hit and miss counts and the hit rate.
+        """
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"cache hits {self.hits}, misses {self.misses} ({rate:.1%} hit rate)"
+
+    def close(self):
+        """Stamps the pages used in this run and closes.
+
+        A page is stamped if any of its lines was looked up in this run, so
+        the next run evicts it after the pages this run did not use.
+
+        Side effects:
+            Writes to and closes the database.
+        """
+        self._stamp_used()
+        self._db.commit()
+        self._db.close()
+
+    def __enter__(self):
+        """Returns the cache so it can be used in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the cache at the end of a with statement."""
+        self.close()
@@ -1,6 +1,21 @@
 from argparse import ArgumentParser
+from array import array
+import bisect
+import heapq
+from itertools import chain, compress, groupby
 import re
 import sys
+import tempfile
+
+import mmap_reader
+from parse_cache import ParseCache
+
+# bytes held per entry during external_sort on top of its two strings: the
+# list slots for them, the normalized int and the (number, name) tuple that
+# _write_run sorts, and that tuple's slot in the run and sort key lists
+ENTRY_OVERHEAD = 128
+
+ENTRY_BYTES_PATTERN = mmap_reader.compile_bytes(r"^(?P<name>[^\t]*)\t(?P<number>[^\t]*)$")
 
 
 LETTER_TO_NUMBER = {
@@ -31,6 +46,20 @@ LETTER_TO_NUMBER = {
     'Y': '9',
     'Z': '9'
 }
+# bytes.translate tables for the batch normalizer: every byte that is not a
+# digit or a capital letter is deleted, then letters become their digit
+KEEP_BYTES = b'0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+DELETE_BYTES = bytes(b for b in range(256) if b not in KEEP_BYTES)
+TRANSLATE_BYTES = bytes.maketrans(
+    ''.join(LETTER_TO_NUMBER).encode('ascii'),
+    ''.join(LETTER_TO_NUMBER.values()).encode('ascii'))
+# normalize_numbers joins a column into one buffer with this byte after each
+# number, which ASCII text never contains, so translate keeps it; the pattern
+# then picks out the last ten digits of each number when they are valid
+SEPARATOR_BYTE = b'\x80'
+DELETE_JOINED_BYTES = DELETE_BYTES.replace(SEPARATOR_BYTE, b'')
+VALID_DIGITS_PATTERN = re.compile(rb'[0-9]*?([1-9](?!11)[0-9]{3}(?!11)[0-9]{6})?\x80')
+
 def letters_to_numbs(match): 
     """Changes letters to numbers.
     
@@ -90,6 +119,25 @@ class PhoneNumber:
         else:
             raise ValueError("invalid phone number")
 
+    @classmethod
+    def from_digits(cls, digits):
+        '''
+        Builds a PhoneNumber from ten digits that are already known to be valid.
+        
+        Args:
+            digits (str): The area code, exchange code and line number, with no
+                separators.
+            
+        Returns:
+            PhoneNumber: The phone number, built without running the regex checks.
+        '''
+        phone_number = cls.__new__(cls)
+        phone_number.area_code = digits[:3]
+        phone_number.exchange_code = digits[3:6]
+        phone_number.line_number = digits[6:]
+        phone_number.number = digits
+        return phone_number
+
     def __int__(self):
         '''
         Converts the phone number string to an integer value.
@@ -130,16 +178,403 @@ class PhoneNumber:
             return False     
     
         
-def read_numbers(filepath):
+def normalize_numbers(raw_numbers):
+    '''
+    Normalizes a whole column of raw phone numbers at once.
+    
+    Each number gets the same treatment as PhoneNumber, but without a Python
+    loop over the numbers: the column is joined into one buffer, one
+    bytes.translate call maps vanity letters to digits and strips everything
+    else, and one re.findall call checks the last ten digits of every number
+    against the area-code and exchange-code rules, giving the digits of each
+    valid number and an empty string for each invalid one, which map(int)
+    parses with a 0 in front.
+    Numbers with non-ASCII characters are left out of the buffer and go
+    through PhoneNumber one by one. No other PhoneNumber objects are created.
+    The returned arrays support the buffer protocol, so numpy.frombuffer can
+    wrap them without copying.
+    
+    Args:
+        raw_numbers (iterable of str or int): The phone numbers to normalize.
+        
+    Returns:
+        tuple: An array('q') of the ten-digit numbers as integers (0 where the
+        number is invalid) and a bytearray mask that is 1 where the number is
+        valid and 0 where it is not. Non-ASCII decimal digits are read by their
+        value.
+    '''
+    raw_numbers = list(map(str, raw_numbers))
+    ascii_numbers = raw_numbers
+    others = []
+    if not ''.join(raw_numbers).isascii():
+        others = [i for i, raw in enumerate(raw_numbers) if not raw.isascii()]
+        ascii_numbers = [raw if raw.isascii() else '' for raw in raw_numbers]
+    buffer = '\x80'.join(chain(ascii_numbers, [''])).encode('latin-1')
+    digits = buffer.translate(TRANSLATE_BYTES, DELETE_JOINED_BYTES)
+    found = VALID_DIGITS_PATTERN.findall(digits)
+    numbers = array('q', map(int, map(b'0'.__add__, found)))
+    valid = bytearray(map(bool, found))
+    for i in others:
+        # non-ASCII digits count as digits to the regex path
+        try:
+            numbers[i] = int(PhoneNumber(raw_numbers[i]).number)
+        except ValueError:
+            continue
+        valid[i] = 1
+    return numbers, valid
+
+
+class PhoneBook:
+    '''
+    A compact collection of named phone numbers.
+    
+    Numbers are kept as integers in a packed int64 array next to a list of
+    names, so sorting compares plain integers and PhoneNumber objects are only
+    made when entries are read back out. A number written with decimal digits
+    other than ASCII ones, which PhoneNumber accepts, is kept as its value, so
+    it is read back out with ASCII digits, where read_numbers keeps the digits
+    as written. Membership is answered from a set of
+    the numbers, and the names for a number are found by bisecting the array
+    once the book is sorted.
+    
+    Attributes:
+        numbers (array): The ten-digit numbers as integers.
+        names (list of str): The name for each number.
+    '''
+    def __init__(self, entries = ()):
+        '''
+        Initializes a PhoneBook, optionally filled from entries.
+        
+        Args:
+            entries (iterable of tuple, optional): (name, number) pairs, where the
+                number is a PhoneNumber or an int. Defaults to an empty book.
+            
+        Side effects:
+            Sets the numbers and names attributes.
+        '''
+        self.numbers = array('q')
+        self.names = []
+        self._members = set()
+        self._sorted = True
+        for name, number in entries:
+            self.add(name, number)
+    
+    @classmethod
+    def from_file(cls, filepath, cache = None, use_mmap = False):
+        '''
+        Reads a file of names and numbers, normalizing the numbers in one batch.
+        
+        Args:
+            filepath (str): The path to the file containing names and phone numbers.
+            cache (ParseCache, optional): A cache of earlier parse results; lines
+                that are not in it are parsed and added. Defaults to None.
+            use_mmap (bool, optional): Scan the file through a memory map and
+                normalize the numbers a block of lines at a time. Not used
+                together with cache. Defaults to False.
+            
+        Returns:
+            PhoneBook: The entries whose numbers are valid, in file order.
+            
+        Raises:
+            ValueError: If a line is not a name and a number separated by one tab.
+        '''
+        book = cls()
+        if cache is not None:
+            names = []
+            numbers = []
+            with open(filepath, 'rb') as f: 
+                for line, result in cache.results(f, _entry_result):
+                    if result:
+                        name, digits = result.split('\t')
+                        names.append(name)
+                        numbers.append(int(digits))
+            book._extend(names, numbers)
+            return book
+        if use_mmap:
+            for names, raw_numbers in _iter_raw_entries_mmap(filepath):
+                numbers, valid = normalize_numbers(raw_numbers)
+                book._extend(list(compress(names, valid)), list(compress(numbers, valid)))
+            return book
+        names = []
+        raw_numbers = []
+        with open(filepath, 'r', encoding = 'UTF-8') as f: 
+            for line in f:
+                name, number = line.strip().split('\t')
+                names.append(name)
+                raw_numbers.append(number)
+        numbers, valid = normalize_numbers(raw_numbers)
+        book._extend(list(compress(names, valid)), list(compress(numbers, valid)))
+        return book
+    
+    def add(self, name, number):
+        '''
+        Adds an entry to the end of the book.
+        
+        Args:
+            name (str): The name for the number.
+            number (PhoneNumber or int): The phone number.
+            
+        Side effects:
+            Appends to numbers and names.
+        '''
+        number = int(number)
+        self._members.add(number)
+        self._sorted = False
+        self.numbers.append(number)
+        self.names.append(name)
+    
+    def _extend(self, names, numbers):
+        '''
+        Adds entries to the end of the book from a list of names and a list of int numbers.
+        '''
+        self._members.update(numbers)
+        if numbers:
+            self._sorted = False
+        self.numbers.extend(numbers)
+        self.names.extend(names)
+    
+    def __len__(self):
+        '''
+        Returns the number of entries.
+        '''
+        return len(self.numbers)
+    
+    def __contains__(self, number):
+        '''
+        Checks whether a number is in the book.
+        
+        Args:
+            number (PhoneNumber, int or str): The number to look for. Strings are
+                normalized the same way PhoneNumber does.
+            
+        Returns:
+            bool: True if at least one entry has the number.
+        '''
+        if isinstance(number, str):
+            try:
+                number = PhoneNumber(number)
+            except ValueError:
+                return False
+        return int(number) in self._members
+    
+    def names_for(self, number):
+        '''
+        Returns every name listed with a number.
+        
+        Args:
+            number (PhoneNumber or int): The number to look up.
+            
+        Returns:
+            list of str: The names, in book order.
+        '''
+        number = int(number)
+        if number not in self._members:
+            return []
+        if not self._sorted:
+            return [name for name, other in zip(self.names, self.numbers) if other == number]
+        start = bisect.bisect_left(self.numbers, number)
+        end = bisect.bisect_right(self.numbers, number, start)
+        return self.names[start:end]
+    
+    def __getitem__(self, index):
+        '''
+        Returns one entry.
+        
+        Args:
+            index (int): The position of the entry.
+            
+        Returns:
+            tuple: The name and a new PhoneNumber for the entry.
+        '''
+        return self.names[index], PhoneNumber.from_digits(f"{self.numbers[index]:010d}")
+    
+    def __iter__(self):
+        '''
+        Yields every entry as a name and a new PhoneNumber, in book order.
+        '''
+        for name, number in zip(self.names, self.numbers):
+            yield name, PhoneNumber.from_digits(f"{number:010d}")
+    
+    def _reorder(self, order):
+        '''
+        Rearranges the entries so the entry at order[i] ends up at position i.
+        '''
+        numbers = self.numbers
+        names = self.names
+        self.numbers = array('q', [numbers[row] for row in order])
+        self.names = [names[row] for row in order]
+    
+    def sort(self):
+        '''
+        Sorts the entries by number, keeping the book order of equal numbers.
+        
+        Side effects:
+            Reorders numbers and names.
+        '''
+        self._reorder(sorted(range(len(self.numbers)), key = self.numbers.__getitem__))
+        self._sorted = True
+    
+    def dedup(self):
+        '''
+        Removes repeated entries that have the same name and number, keeping the first.
+        
+        Side effects:
+            Removes entries from numbers and names.
+        '''
+        seen = set()
+        order = []
+        for row, entry in enumerate(zip(self.numbers, self.names)):
+            if entry not in seen:
+                seen.add(entry)
+                order.append(row)
+        if len(order) < len(self.numbers):
+            self._reorder(order)
+
+
+class PhoneIndex:
+    '''
+    Prefix and range queries over the numbers in a PhoneBook.
+    
+    The book is sorted by number, so every area code, or area code and exchange
+    code block, is one contiguous slice of the numbers array that bisect finds
+    in O(log n) steps.
+    
+    Attributes:
+        book (PhoneBook): The indexed entries, sorted by number.
+    '''
+    def __init__(self, book):
+        '''
+        Initializes a PhoneIndex.
+        
+        Args:
+            book (PhoneBook): The entries to index.
+            
+        Side effects:
+            Sorts the book in place.
+        '''
+        book.sort()
+        self.book = book
+    
+    @staticmethod
+    def _prefix_bounds(prefix):
+        '''
+        Returns the smallest and largest numbers that start with a prefix.
+        
+        Raises:
+            ValueError: If the prefix does not have one to ten digits.
+        '''
+        digits = re.sub(r'\D', '', str(prefix))
+        if not 1 <= len(digits) <= 10:
+            raise ValueError("prefix must have one to ten digits")
+        scale = 10 ** (10 - len(digits))
+        low = int(digits) * scale
+        return low, low + scale - 1
+    
+    def _slice(self, low, high):
+        '''
+        Returns the start and end positions of the numbers between low and high.
+        '''
+        numbers = self.book.numbers
+        return bisect.bisect_left(numbers, low), bisect.bisect_right(numbers, high)
+    
+    def range(self, low, high):
+        '''
+        Returns the entries whose numbers are between low and high.
+        
+        Args:
+            low (int): The smallest ten-digit number to include.
+            high (int): The largest ten-digit number to include.
+            
+        Returns:
+            list of tuple: (name, PhoneNumber) entries in number order.
+        '''
+        start, end = self._slice(low, high)
+        return [self.book[row] for row in range(start, end)]
+    
+    def prefix(self, prefix):
+        '''
+        Returns the entries whose numbers start with a prefix.
+        
+        Args:
+            prefix (str or int): Leading digits, e.g. an area code ("301") or an
+                area code and exchange code ("301555"). Separators are ignored.
+            
+        Returns:
+            list of tuple: (name, PhoneNumber) entries in number order.
+        '''
+        return self.range(*self._prefix_bounds(prefix))
+    
+    def count(self, prefix):
+        '''
+        Counts the entries whose numbers start with a prefix, without building them.
+        
+        Args:
+            prefix (str or int): Leading digits of a number.
+            
+        Returns:
+            int: The number of matching entries.
+        '''
+        start, end = self._slice(*self._prefix_bounds(prefix))
+        return end - start
+    
+    def counts_by_prefix(self, length = 3):
+        '''
+        Counts the entries under every prefix of a given length.
+        
+        Args:
+            length (int, optional): The prefix length; 3 groups by area code and 6
+                by area code and exchange code. Defaults to 3.
+            
+        Returns:
+            dict: Each zero-padded prefix mapped to its number of entries, in
+            prefix order.
+        '''
+        scale = 10 ** (10 - length)
+        return {f"{key:0{length}d}": len(list(group))
+                for key, group in groupby(self.book.numbers, lambda number: number // scale)}
+    
+    def names_for(self, number):
+        '''
+        Returns every name listed with a number.
+        
+        Args:
+            number (PhoneNumber, int or str): The number to look up.
+            
+        Returns:
+            list of str: The names, or an empty list if the number is not valid
+            or not in the book.
+        '''
+        if isinstance(number, str):
+            try:
+                number = PhoneNumber(number)
+            except ValueError:
+                return []
+        return self.book.names_for(number)
+
+
+def read_numbers(filepath, use_mmap = False, cache = None):
     '''
     Reads names and phone numbers from a text file and processes them.
     
     Args:
         filepath (str): The path to the file containing names and phone numbers.
+        use_mmap (bool, optional): Scan the file through a memory map and decode
+            only the name and number fields. Not used together with cache.
+            Defaults to False.
+        cache (ParseCache, optional): A cache of earlier parse results; lines that
+            are not in it are parsed and added. Defaults to None.
         
     Returns:
         list: A list of tuples containing names and PhoneNumber objects.
     '''
+    if cache is not None:
+        phone = list(_iter_entries_cached(filepath, cache))
+        phone.sort(key= lambda p: p[1])
+        return phone
+    if use_mmap:
+        phone = list(_iter_entries_mmap(filepath))
+        phone.sort(key= lambda p: p[1])
+        return phone
     with open(filepath, 'r', encoding = 'UTF-8') as f: 
         phone = []
         for line in f:
@@ -153,19 +588,273 @@ def read_numbers(filepath):
         phone.sort(key= lambda p: p[1])
     return phone
 
+
+def _entry_result(line):
+    '''
+    Parses one line into the form kept in a ParseCache.
+    
+    Args:
+        line (bytes): A name and a phone number separated by a tab, as read in
+            binary mode without the newline.
+        
+    Returns:
+        str: The name and the ten digits separated by a tab, or an empty string
+        if the number is invalid.
+        
+    Raises:
+        ValueError: If the line is not a name and a number separated by one tab.
+    '''
+    name, number = line.decode('UTF-8').strip().split('\t')
+    try: 
+        return f"{name}\t{PhoneNumber(number).number}"
+    except ValueError:
+        return ''
+
+
+def _iter_entries_cached(filepath, cache):
+    '''
+    Yields the valid (name, PhoneNumber) entries of a file, reusing cached results.
+    
+    Args:
+        filepath (str): The path to the file containing names and phone numbers.
+        cache (ParseCache): A cache that maps each line to its name and digits,
+            or to an empty string if the number is invalid.
+        
+    Yields:
+        tuple: A name and its PhoneNumber object, in file order.
+        
+    Raises:
+        ValueError: If a line is not a name and a number separated by one tab.
+    '''
+    with open(filepath, 'rb') as f: 
+        for line, result in cache.results(f, _entry_result):
+            if result:
+                name, digits = result.split('\t')
+                yield name, PhoneNumber.from_digits(digits)
+
+
+def _iter_raw_entries_mmap(filepath):
+    '''
+    Yields the names and raw numbers of a file read through a memory map.
+    
+    The map is read a block of lines at a time. One bytes regex call splits 
+    every line of a block into its name and number, and all of the fields are 
+    decoded in one call. A block the bytes regex can not take is decoded and 
+    split a line at a time, as the text reader does.
+    
+    Args:
+        filepath (str): The path to the file containing names and phone numbers.
+        
+    Yields:
+        tuple: A list of names and a list of the raw numbers written with them,
+        for each block of lines, in file order.
+        
+    Raises:
+        ValueError: If a line is not a name and a number separated by one tab.
+    '''
+    with mmap_reader.open_mmap(filepath) as buf: 
+        for block in mmap_reader.iter_blocks(buf):
+            rows = mmap_reader.match_block(block, ENTRY_BYTES_PATTERN)
+            if rows is None:
+                names = []
+                raw_numbers = []
+                for line in block.decode('UTF-8').split('\n'):
+                    name, number = line.strip().split('\t')
+                    names.append(name)
+                    raw_numbers.append(number)
+                yield names, raw_numbers
+                continue
+            fields = b'\n'.join(chain.from_iterable(rows)).decode('UTF-8').split('\n')
+            names = [name.lstrip() for name in fields[0::2]]
+            raw_numbers = fields[1::2]
+            if '' in names or not all(map(str.strip, raw_numbers)):
+                for name, raw in zip(names, raw_numbers):
+                    # strip() takes the tab with it, so this raises the same 
+                    # ValueError the text reader does
+                    name, number = (name + '\t' + raw).strip().split('\t')
+            yield names, raw_numbers
+
+
+def _iter_entries_mmap(filepath):
+    '''
+    Yields the valid (name, PhoneNumber) entries of a file read through a memory map.
+    
+    The numbers of each block from _iter_raw_entries_mmap are checked by 
+    normalize_numbers instead of the PhoneNumber regexes, except for numbers 
+    that are not all ASCII, which are given to PhoneNumber so their digits 
+    are kept as written, as the text reader keeps them.
+    
+    Args:
+        filepath (str): The path to the file containing names and phone numbers.
+        
+    Yields:
+        tuple: A name and its PhoneNumber object, in file order.
+        
+    Raises:
+        ValueError: If a line is not a name and a number separated by one tab.
+    '''
+    for names, raw_numbers in _iter_raw_entries_mmap(filepath):
+        numbers, valid = normalize_numbers(raw_numbers)
+        for name, raw, number in compress(zip(names, raw_numbers, numbers), valid):
+            if raw.isascii():
+                yield name, PhoneNumber.from_digits(f"{number:010d}")
+            else:
+                yield name, PhoneNumber(raw)
+
+
+def _write_run(names, raw_numbers, dedup, directory):
+    '''
+    Sorts one run of entries and writes it to a temporary file.
+    
+    The run is sorted as (number, name) tuples rather than loaded into a
+    PhoneBook, so it holds nothing per entry beyond what ENTRY_OVERHEAD counts.
+    
+    Args:
+        names (list of str): The names in the run.
+        raw_numbers (list of str): The raw phone numbers in the run.
+        dedup (bool): Whether to leave out repeated name and number entries.
+        directory (str): The directory to write the run file in.
+        
+    Returns:
+        str: The path of the run file. Each line is a zero-padded ten-digit
+        number, a tab and a name, in number order.
+    '''
+    numbers, valid = normalize_numbers(raw_numbers)
+    entries = list(compress(zip(numbers, names), valid))
+    del numbers, valid
+    entries.sort(key = lambda entry: entry[0])
+    fd, path = tempfile.mkstemp(suffix = '.run', dir = directory)
+    with open(fd, 'w', encoding = 'UTF-8') as f: 
+        current = None
+        seen = set()
+        for number, name in entries:
+            if dedup:
+                if number != current:
+                    current = number
+                    seen = set()
+                if name in seen:
+                    continue
+                seen.add(name)
+            f.write(f"{number:010d}\t{name}\n")
+    return path
+
+
+def external_sort(filepath, out, max_memory, dedup = False):
+    '''
+    Sorts a file of names and numbers that may be larger than memory.
+    
+    Entries are read in runs that fit in max_memory, each run is sorted and
+    spilled to a temporary file, and the run files are merged. The merge is
+    stable, so equal numbers stay in file order just like read_numbers.
+    
+    Args:
+        filepath (str): The path to the file containing names and phone numbers.
+        out (file): Where to write the sorted "(area) exchange-line<tab>name" lines.
+        max_memory (int): Roughly how many bytes of entries to hold at once.
+        dedup (bool, optional): Leave out repeated name and number entries.
+            Defaults to False.
+        
+    Side effects:
+        Writes to out, and creates and removes temporary run files.
+        
+    Raises:
+        ValueError: If a line is not a name and a number separated by one tab.
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+        runs = []
+        names = []
+        raw_numbers = []
+        used = 0
+        with open(filepath, 'r', encoding = 'UTF-8') as f: 
+            for line in f:
+                name, number = line.strip().split('\t')
+                names.append(name)
+                raw_numbers.append(number)
+                used += ENTRY_OVERHEAD + sys.getsizeof(name) + sys.getsizeof(number)
+                if used >= max_memory:
+                    runs.append(_write_run(names, raw_numbers, dedup, directory))
+                    names = []
+                    raw_numbers = []
+                    used = 0
+        if names or not runs:
+            runs.append(_write_run(names, raw_numbers, dedup, directory))
+        files = [open(run, 'r', encoding = 'UTF-8') for run in runs]
+        try:
+            current = None
+            seen = set()
+            for line in heapq.merge(*files, key = lambda line: line[:10]):
+                digits, name = line[:10], line[11:-1]
+                if digits != current:
+                    current = digits
+                    seen = set()
+                if dedup:
+                    if name in seen:
+                        continue
+                    seen.add(name)
+                out.write(f"{PhoneNumber.from_digits(digits)}\t{name}\n")
+        finally:
+            for f in files:
+                f.close()
+
             
-def main(path):
+def main(path, use_mmap=False, cache_dir=None, dedup=False, max_memory=None):
     """Read data from path and print results.
     
     Args:
         path (str): path to a text file. Each line in the file should consist of
             a name, a tab character, and a phone number.
+        use_mmap (bool, optional): read the file through a memory map. Defaults
+            to False.
+        cache_dir (str, optional): a directory of cached parse results to use
+            and update. Defaults to None.
+        dedup (bool, optional): leave out repeated name and number entries.
+            Defaults to False.
+        max_memory (int, optional): sort with external_sort, holding roughly
+            this many bytes of entries at once. Defaults to None, which sorts
+            in memory.
     
     Side effects:
-        Writes to stdout.
+        Writes to stdout, and writes cache statistics to stderr.
     """
-    for name, number in read_numbers(path):
+    if max_memory:
+        external_sort(path, sys.stdout, max_memory, dedup)
+        return
+    cache = ParseCache(cache_dir, "phone") if cache_dir else None
+    book = PhoneBook.from_file(path, cache, use_mmap and cache is None)
+    if dedup:
+        book.dedup()
+    book.sort()
+    for name, number in book:
         print(f"{number}\t{name}")
+    if cache is not None:
+        print(cache.stats(), file=sys.stderr)
+        cache.close()
+
+
+def query(path, prefix=None, count_by=None, lookup=None):
+    """Load path into a PhoneIndex and print the answer to one query.
+    
+    Args:
+        path (str): path to a text file of names and phone numbers.
+        prefix (str, optional): print the entries whose number starts with
+            these digits.
+        count_by (int, optional): print how many entries share each prefix of
+            this many digits.
+        lookup (str, optional): print the names listed with this number.
+    
+    Side effects:
+        Writes to stdout.
+    """
+    index = PhoneIndex(PhoneBook.from_file(path))
+    if prefix is not None:
+        for name, number in index.prefix(prefix):
+            print(f"{number}\t{name}")
+    elif count_by is not None:
+        for key, count in index.counts_by_prefix(count_by).items():
+            print(f"{key}\t{count}")
+    else:
+        for name in index.names_for(lookup):
+            print(name)
 
 
 def parse_args(arglist):
@@ -174,17 +863,54 @@ def parse_args(arglist):
     Expects one mandatory command-line argument: a path to a text file where
     each line consists of a name, a tab character, and a phone number.
     
+    This function also allows the following optional arguments:
+    
+        --mmap: read the file through a memory map
+        --cache (str): keep parse results in this directory and reuse them
+            on later runs
+        --dedup: leave out repeated name and number entries
+        --max-memory (int): sort in runs of about this many megabytes,
+            spilling them to temporary files (--mmap and --cache are not used)
+    
+    and, instead of listing the whole file, one of these queries:
+    
+        --prefix (str): list the entries whose number starts with these digits
+        --count-by (int): count the entries under each prefix of this length
+        --lookup (str): list the names that have this number
+    
     Args:
         arglist (list of str): a list of command-line arguments to parse.
         
     Returns:
         argparse.Namespace: a namespace object with a file attribute whose value
-        is a path to a text file as described above.
+        is a path to a text file as described above, an mmap attribute (bool),
+        a cache attribute (str or None), a dedup attribute (bool) and a
+        max_memory attribute (int or None, in megabytes), and the query
+        attributes prefix, count_by and lookup (None when not given).
     """
     parser = ArgumentParser()
     parser.add_argument("file", help="file of names and numbers")
+    parser.add_argument("--mmap", action="store_true",
+                        help="read the file through a memory map")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="directory of cached parse results to reuse")
+    parser.add_argument("--dedup", action="store_true",
+                        help="leave out repeated name and number entries")
+    parser.add_argument("--max-memory", type=int, metavar="MB",
+                        help="sort larger-than-memory files in runs of this size")
+    queries = parser.add_mutually_exclusive_group()
+    queries.add_argument("--prefix",
+                         help="list entries whose number starts with these digits")
+    queries.add_argument("--count-by", type=int, choices=range(1, 11),
+                         metavar="DIGITS",
+                         help="count entries under each prefix of this length")
+    queries.add_argument("--lookup", help="list the names that have this number")
     return parser.parse_args(arglist)
 
 if __name__ == "__main__":
     args = parse_args(sys.argv[1:])
-    main(args.file)
+    if args.prefix or args.count_by or args.lookup:
+        query(args.file, args.prefix, args.count_by, args.lookup)
+    else:
+        max_memory = args.max_memory * 1024 * 1024 if args.max_memory else None
+        main(args.file, args.mmap, args.cache, args.dedup, max_memory)
@@ -0,0 +1,70 @@
+"""Checks AddressTable and AddressIndex against the Address objects they were built from."""
+import pytest
+
+import parse_addresses
+
+LINES = [
+    "101 Main St, Laurel MD 20707",
+    "12B Elm Ave, College Park MD 20740",
+    "7 Oak Rd, Silver Spring MD  20901",
+    "1 Main St, Laurel MD ٢٠٧٠٧",
+    "٥ Rue Ste, Montréal QC 20707",
+    "44 Main St, Laurel MD 20707",
+    "9 Bay Dr, Annapolis MD 21401",
+    "300 Pine Ln, Dover DE 19901",
+]
+ADDRESSES = [parse_addresses.Address(line) for line in LINES]
+
+
+def test_table_rows_match_addresses():
+    table = parse_addresses.AddressTable(ADDRESSES)
+    assert [vars(address) for address in table] == [vars(address) for address in ADDRESSES]
+    assert [vars(table[index]) for index in range(-len(LINES), 0)] == \
+        [vars(address) for address in ADDRESSES]
+    assert list(table.rows()) == [tuple(getattr(address, column) for column in table.COLUMNS)
+                                  for address in ADDRESSES]
+    assert table.row(3)[4] == "٢٠٧٠٧"
+
+
+def test_parallel_matches_serial(tmp_path):
+    path = tmp_path / "addresses.txt"
+    path.write_bytes(("\r\n".join(LINES * 50)).encode("UTF-8"))
+    serial = parse_addresses.read_addresses(str(path))
+    parallel = parse_addresses.read_addresses_parallel(str(path), workers = 2)
+    assert [vars(address) for address in parallel] == [vars(address) for address in serial]
+
+
+def test_index_matches_brute_force():
+    addresses = ADDRESSES + [parse_addresses.Address(line) for line in (
+        "2 Elm St, Boston MA 02134", "8 Elm St, Boston MA 02134", "5 Shore Rd, Laurel DE 19956")]
+    index = parse_addresses.AddressIndex(addresses[:4])
+    index.zip_range(0, 99999)
+    # rows added after a range query are merged into the sorted index
+    index.extend(addresses[4:])
+    zips = [int(address.zip) for address in addresses]
+
+    def rows(addresses):
+        return [vars(address) for address in addresses]
+
+    def matching(keep):
+        # sorted is stable, so equal zips stay in input order like the index
+        return [vars(address) for zip_code, address in
+                sorted(zip(zips, addresses), key = lambda pair: pair[0]) if keep(zip_code)]
+
+    for zip_code in set(zips) | {12345}:
+        assert rows(index.by_zip(zip_code)) == rows(a for z, a in zip(zips, addresses) if z == zip_code)
+        assert rows(index.by_zip(f"{zip_code:05d}")) == rows(index.by_zip(zip_code))
+    for state in {address.state for address in addresses} | {"ZZ"}:
+        assert rows(index.by_state(state)) == rows(a for a in addresses if a.state == state)
+        for city in {address.city for address in addresses}:
+            assert rows(index.by_city(city, state)) == \
+                rows(a for a in addresses if (a.city, a.state) == (city, state))
+    for low, high in [(0, 99999), (19901, 20740), (20707, 20707), (20708, 20739), (30000, 0)]:
+        assert rows(index.zip_range(low, high)) == matching(lambda z: low <= z <= high)
+    for prefix in ["0", "02", "1", "19", "2", "20", "207", "20707", "9", "99999"]:
+        found = index.zip_prefix(prefix)
+        assert rows(found) == matching(lambda z: f"{z:05d}".startswith(prefix))
+        assert len(found) == sum(f"{z:05d}".startswith(prefix) for z in zips)
+    for prefix in ["", "123456", "2a", " 20"]:
+        with pytest.raises(ValueError):
+            index.zip_prefix(prefix)
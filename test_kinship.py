@@ -0,0 +1,229 @@
+"""Checks that every way of loading or changing a family answers like Family(json.load(f))."""
+import io
+import json
+import sys
+import types
+
+import pytest
+
+try:
+    import relationships
+except ImportError:
+    # kinship only reads relationships.relationships, which the tests below
+    # replace with their own table
+    sys.modules["relationships"] = types.ModuleType("relationships")
+
+import kinship
+
+# every term names its own path, so two paths that tie on length but differ
+# in direction, such as ":S" and "S:" for a married couple, give different
+# answers, and the comparisons below have to allow for either
+GENDERS = ("female", "male", "nonbinary")
+PATHS = (":", "P:", ":P", "S:", ":S", "P:P", "PP:", ":PP", "PP:P", "P:PP", "PP:PP",
+         "SP:", ":PS", "P:S", "S:P")
+TABLE = {path: {gender: f"{gender} {path}" for gender in GENDERS} for path in PATHS}
+
+# Dad marries Ex and then Mom, so the order of couples decides whether he
+# reaches Nana, Mom's mother, through his spouse; Stranger is related to nobody.
+FAMILY = {
+    "individuals": {
+        "Gran": "female", "Grandpa": "male", "Dad": "male", "Aunt": "female",
+        "Uncle": "male", "Mom": "female", "Ex": "female", "Kid": "nonbinary",
+        "Sis": "female", "Cousin": "male", "Stepkid": "female", "Nana": "female",
+        "Stranger": "male",
+    },
+    "parents": {
+        "Dad": ["Gran", "Grandpa"],
+        "Aunt": ["Gran", "Grandpa"],
+        "Kid": ["Dad", "Mom"],
+        "Sis": ["Dad", "Mom"],
+        "Cousin": ["Aunt", "Uncle"],
+        "Stepkid": ["Ex"],
+        "Mom": ["Nana"],
+    },
+    "couples": [["Gran", "Grandpa"], ["Aunt", "Uncle"], ["Dad", "Ex"], ["Dad", "Mom"]],
+}
+
+
+@pytest.fixture(autouse = True)
+def table(monkeypatch):
+    monkeypatch.setattr(kinship, "relationships", types.SimpleNamespace(relationships = TABLE))
+
+
+@pytest.fixture
+def family_file(tmp_path):
+    path = tmp_path / "family.json"
+    path.write_text(json.dumps(FAMILY), encoding = "utf-8")
+    return str(path)
+
+
+def reference(familydict = FAMILY):
+    """Returns every answer Family(json.load(f)) could give for each pair.
+
+    Family names the relation from one of the shared people with the
+    shortest combined path, and which one it picks when several tie depends
+    on set order, so each pair maps to the set of terms of all of them.
+    """
+    family = kinship.Family(json.loads(json.dumps(familydict)))
+    answers = {}
+    for name1, person1 in family.people.items():
+        for name2, person2 in family.people.items():
+            paths1 = person1.connections()
+            paths2 = person2.connections()
+            shared = set(paths1) & set(paths2)
+            if not shared:
+                answers[name1, name2] = {None}
+                continue
+            shortest = min(len(paths1[p]) + len(paths2[p]) for p in shared)
+            keys = {f"{paths1[p]}:{paths2[p]}" for p in shared
+                    if len(paths1[p]) + len(paths2[p]) == shortest}
+            answers[name1, name2] = {TABLE[key][person1.gender] if key in TABLE
+                                     else 'distant relative' for key in keys}
+    return answers
+
+
+def assert_answers(family, expected):
+    answers = {pair: family.relation(*pair) for pair in expected}
+    assert {pair: answer for pair, answer in answers.items() if answer not in expected[pair]} == {}
+
+
+@pytest.mark.parametrize("stream, compact", [(True, False), (False, True), (True, True)])
+def test_loaders_match_json_load(family_file, stream, compact):
+    assert_answers(kinship.load_family(family_file, stream, compact), reference())
+
+
+def test_snapshot_matches_json_load(family_file, tmp_path):
+    snapshot = str(tmp_path / "family.snap")
+    kinship.load_family(family_file, stream = True, compact = True).write_snapshot(snapshot)
+    family = kinship.load_family(snapshot)
+    assert isinstance(family, kinship.CompactFamily)
+    assert_answers(family, reference())
+
+
+def test_remarriage_keeps_file_order(family_file):
+    assert kinship.load_family_stream(family_file).people["Dad"].spouse.name == "Mom"
+    compact = kinship.CompactFamily.from_records(kinship.iter_family_file(family_file))
+    expected = reference()
+    assert_answers(compact, {("Dad", name): expected["Dad", name]
+                             for name in ("Mom", "Ex", "Nana", "Stepkid")})
+
+
+def test_answers_after_changes():
+    family = kinship.Family(json.loads(json.dumps(FAMILY)))
+    index = kinship.AncestryIndex(family)
+    names = list(FAMILY["individuals"])
+    # fill the caches so the changes have something to invalidate
+    for name1 in names:
+        for name2 in names:
+            family.relation(name1, name2)
+            index.relation(name1, name2)
+
+    changed = json.loads(json.dumps(FAMILY))
+    family.add_person("Baby", "female")
+    changed["individuals"]["Baby"] = "female"
+    family.add_parent("Baby", "Cousin")
+    changed["parents"]["Baby"] = ["Cousin"]
+    family.add_parent("Stranger", "Uncle")
+    changed["parents"]["Stranger"] = ["Uncle"]
+    family.add_couple("Stranger", "Stepkid")
+    changed["couples"].append(["Stranger", "Stepkid"])
+    index.refresh()
+
+    expected = reference(changed)
+    assert_answers(family, expected)
+    assert_answers(index, expected)
+
+
+def test_answers_with_parent_loop():
+    # a ring of twelve, each the parent of the last, has nobody above it, and
+    # people halfway round it only meet beyond the relationships table
+    family = kinship.Family(json.loads(json.dumps(FAMILY)))
+    index = kinship.AncestryIndex(family)
+    changed = json.loads(json.dumps(FAMILY))
+    ring = [f"Ring{i}" for i in range(12)]
+    for name in ring:
+        family.add_person(name, "female")
+        changed["individuals"][name] = "female"
+    for child, parent in zip(ring, ring[1:] + ring[:1]):
+        family.add_parent(child, parent)
+        changed["parents"][child] = [parent]
+
+    expected = reference(changed)
+    assert expected["Ring0", "Ring6"] == {'distant relative'}
+    assert_answers(family, expected)
+    assert_answers(index, expected)
+    assert_answers(kinship.AncestryIndex(family), expected)
+    assert_answers(kinship.AncestryIndex(family, cache_size = 1), expected)
+
+
+def test_answers_beyond_the_near_maps():
+    # two lines of seven generations, one above Kid and one above Stranger;
+    # the tops of both lines marry, then Top1 is given a parent as well, so
+    # the cached meeting points are out of date twice
+    family = kinship.Family(json.loads(json.dumps(FAMILY)))
+    index = kinship.AncestryIndex(family)
+    changed = json.loads(json.dumps(FAMILY))
+
+    def add_parent(name, parent):
+        if parent not in changed["individuals"]:
+            family.add_person(parent, "male")
+            changed["individuals"][parent] = "male"
+        family.add_parent(name, parent)
+        changed["parents"].setdefault(name, []).append(parent)
+
+    for child, line in (("Kid", "Up"), ("Stranger", "Far")):
+        for i in range(7):
+            add_parent(child, f"{line}{i}")
+            child = f"{line}{i}"
+    assert_answers(index, reference(changed))
+    family.add_couple("Up6", "Far6")
+    changed["couples"].append(["Up6", "Far6"])
+    expected = reference(changed)
+    assert expected["Kid", "Far0"] == {'distant relative'}
+    assert_answers(index, expected)
+    add_parent("Far6", "Up5")
+    assert_answers(index, reference(changed))
+
+
+def test_read_pairs_crlf(tmp_path):
+    path = tmp_path / "pairs.tsv"
+    path.write_bytes(b"Kid\tSis\r\n\r\nDad\tMom")
+    assert kinship.read_pairs(str(path)) == [("Kid", "Sis"), ("Dad", "Mom")]
+
+
+def test_change_log_is_capped():
+    family = kinship.Family(json.loads(json.dumps(FAMILY)), max_changes = 4)
+    index = kinship.AncestryIndex(family)
+    changed = json.loads(json.dumps(FAMILY))
+    for i in range(5):
+        name = f"Baby{i}"
+        family.add_person(name, "female")
+        changed["individuals"][name] = "female"
+        family.add_parent(name, "Cousin")
+        changed["parents"][name] = ["Cousin"]
+
+    assert len(family.changes) <= 4
+    assert family.changes_since(family.version - 1) == family.changes[-1:]
+    # the index has fallen out of the log, so it rebuilds
+    assert family.changes_since(index.version) is None
+    expected = reference(changed)
+    assert_answers(index, expected)
+    assert index.version == family.version
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 8))
+def test_stream_numbers_cut_between_chunks(chunk_size):
+    text = '{"version": 12.5e3, "count": -7, "ok": true, "individuals": {}}'
+    stream = kinship._JSONStream(io.StringIO(text), chunk_size)
+    assert {key: stream.value() for key in stream.members()} == json.loads(text)
+
+
+def test_batch_keeps_the_cache_size():
+    family = kinship.Family(json.loads(json.dumps(FAMILY)), cache_size = 2)
+    names = list(FAMILY["individuals"])
+    pairs = [(name1, name2) for name1 in names for name2 in names]
+    expected = reference()
+    results = kinship.batch_relations(family, pairs)
+    assert {(name1, name2): relation for name1, name2, relation in results
+            if relation not in expected[name1, name2]} == {}
+    assert family.cache_size == 2 and len(family._connections) <= 2
@@ -0,0 +1,87 @@
+"""Checks the kinship server end to end over a local TCP socket."""
+import asyncio
+import json
+import threading
+
+from test_kinship import FAMILY, table  # noqa: F401 (table is an autouse fixture)
+import kinship
+import kinship_server
+
+
+def make_server():
+    return kinship_server.KinshipServer({"smith": kinship.Family(json.loads(json.dumps(FAMILY)))})
+
+
+async def send(reader, writer, request):
+    """Sends one request line and returns the decoded response."""
+    writer.write(request if isinstance(request, bytes) else json.dumps(request).encode() + b"\n")
+    return json.loads(await asyncio.wait_for(reader.readline(), 5))
+
+
+async def round_trip(server, requests):
+    """Sends requests one by one over one connection and returns the responses."""
+    listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    try:
+        reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+        responses = [await send(reader, writer, request) for request in requests]
+        writer.close()
+        return responses
+    finally:
+        listener.close()
+
+
+def test_requests_are_answered():
+    server = make_server()
+    answer = kinship.Family(json.loads(json.dumps(FAMILY))).relation("Kid", "Sis")
+    responses = asyncio.run(round_trip(server, [
+        {"id": 1, "name1": "Kid", "name2": "Sis"},
+        {"id": 2, "family": "smith", "name1": "Kid", "name2": "Sis"},
+        {"id": 3, "name1": "Kid", "name2": "Stranger"},
+        {"id": 4, "name1": "Kid", "name2": "Nobody"},
+        {"id": 5, "family": "jones", "name1": "Kid", "name2": "Sis"},
+        b"not json\n",
+        {"id": 6, "type": "metrics"},
+    ]))
+    assert [r["id"] for r in responses] == [1, 2, 3, 4, 5, None, 6]
+    assert responses[0]["ok"] and responses[0]["result"] == answer
+    assert not responses[0]["cached"] and responses[1]["cached"]
+    assert responses[2] == dict(responses[2], ok=True, result=None, cached=False)
+    assert responses[3]["error"] == "unknown person: Nobody"
+    assert responses[4]["error"] == "unknown family: jones"
+    assert not responses[5]["ok"]
+    metrics = responses[6]["result"]
+    assert (metrics["requests"], metrics["errors"]) == (6, 3)
+    assert (metrics["cache_hits"], metrics["cache_misses"], metrics["cache_entries"]) == (1, 3, 2)
+
+
+def test_slow_lookup_does_not_block_other_connections():
+    server = make_server()
+    index = server.families["smith"]
+    release = threading.Event()
+    slow_relation = index.relation
+
+    def relation(name1, name2):
+        release.wait(5)
+        return slow_relation(name1, name2)
+    index.relation = relation
+
+    async def run():
+        listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+        address = listener.sockets[0].getsockname()[:2]
+        try:
+            slow = await asyncio.open_connection(*address)
+            fast = await asyncio.open_connection(*address)
+            waiting = asyncio.create_task(send(*slow, {"id": 1, "name1": "Kid", "name2": "Sis"}))
+            await asyncio.sleep(0.05)
+            # the slow lookup is still on the worker thread, but the event
+            # loop answers the other connection
+            metrics = await send(*fast, {"id": 2, "type": "metrics"})
+            assert not waiting.done()
+            release.set()
+            return metrics, await waiting
+        finally:
+            listener.close()
+
+    metrics, answer = asyncio.run(run())
+    assert metrics["ok"] and metrics["result"]["requests"] == 0
+    assert answer["ok"] and answer["result"] == slow_relation("Kid", "Sis")
@@ -0,0 +1,77 @@
+"""Checks that the closed-form and cent-exact payoff counts agree with stepping through the schedule."""
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP, localcontext
+import itertools
+
+import pytest
+
+import mortgage
+
+# principal, annual rate, payments per year and term in years, paid at the
+# minimum payment
+LOANS = list(itertools.product((1000, 50000, 123456.78, 350000), (0, 0.01, 0.035, 0.0725, 0.12),
+                               (12, 26, 4), (5, 15, 30)))
+
+
+def min_payment(p, rate, per_year, years):
+    if rate == 0:
+        return -(-p // (years * per_year))
+    return mortgage.get_min_payment(p, rate, years, per_year)
+
+
+def decimal_count(balance, rate, payment, per_year, rounding):
+    """Counts payments by stepping in Decimal dollars, rounding each interest to the cent."""
+    balance, payment = Decimal(balance) / 100, Decimal(payment) / 100
+    r = Decimal(str(rate)) / per_year
+    count = 0
+    while balance > 0:
+        balance -= payment - (balance * r).quantize(mortgage.CENT, rounding = rounding)
+        count += 1
+    return count
+
+
+@pytest.mark.parametrize("p, rate, per_year, years", LOANS)
+def test_payoff_count_matches_stepping(p, rate, per_year, years):
+    payment = min_payment(p, rate, per_year, years)
+    count = mortgage.remaining_payments(p, rate, payment, per_year)
+    assert mortgage.payoff_count(p, rate, payment, per_year) == count
+    assert len(list(mortgage.amortization_schedule(p, rate, payment, per_year))) == count
+    assert mortgage.payoff_count([p], rate, [payment], per_year) == [count]
+
+
+@pytest.mark.parametrize("p, rate, per_year, years", LOANS)
+@pytest.mark.parametrize("rounding", (ROUND_HALF_UP, ROUND_HALF_EVEN))
+def test_payoff_count_cents_matches_stepping(p, rate, per_year, years, rounding):
+    balance = mortgage.to_cents(p)
+    payment = mortgage.to_cents(min_payment(p, rate, per_year, years))
+    count = mortgage.payoff_count_cents(balance, rate, payment, per_year, rounding)
+    schedule = list(mortgage.amortization_schedule_cents(balance, rate, payment, per_year, rounding))
+    assert count == len(schedule) == decimal_count(balance, rate, payment, per_year, rounding)
+    assert schedule[-1].balance == 0
+    assert sum(row.principal for row in schedule) == balance
+    # interest is rounded to the cent each period, so the float count can
+    # only differ by the last, smallest payment
+    assert abs(count - mortgage.remaining_payments(p, rate, payment / 100, per_year)) <= 1
+
+
+def test_exact_min_payment_pays_off_in_term():
+    payment = mortgage.min_payment_cents("250000", "0.065", 30, 12)
+    assert mortgage.exact_min_payment("250000", "0.065", 30, 12) == Decimal(payment).scaleb(-2)
+    assert mortgage.payoff_count_cents(25_000_000, "0.065", payment) == 360
+    assert mortgage.payoff_count_cents(25_000_000, "0.065", payment - 1) == 361
+
+
+def test_exact_payments_ignore_the_thread_context():
+    payment = mortgage.min_payment_cents("250000", "0.065", 30, 12)
+    exact = mortgage.exact_min_payment("250000", "0.065", 30, 12)
+    with localcontext(prec = 3, rounding = ROUND_HALF_EVEN):
+        assert mortgage.min_payment_cents("250000", "0.065", 30, 12) == payment
+        assert mortgage.exact_min_payment("250000", "0.065", 30, 12) == exact
+        assert mortgage.to_cents("1580.175") == 158018
+
+
+def test_payment_below_interest_is_rejected():
+    with pytest.raises(ValueError):
+        mortgage.payoff_count(100000, 0.12, 1000)
+    with pytest.raises(ValueError):
+        mortgage.payoff_count_cents(10_000_000, 0.12, 100_000)
+    assert mortgage.payoff_count([100000, 1000], 0.12, [1000, 100]) == [-1, 11]
@@ -0,0 +1,74 @@
+"""Checks the normalization service end to end over a local TCP socket."""
+import asyncio
+import json
+
+import normalize_service
+
+PHONE = {"type": "phone", "value": "1-800-FLOWERS"}
+ADDRESS = {"type": "address", "value": "101 Main St, Laurel MD 20707"}
+
+
+async def round_trip(service, requests):
+    """Sends request lines over one connection and returns the responses by id."""
+    runners = [asyncio.create_task(batcher.run()) for batcher in service.batchers.values()]
+    server = await asyncio.start_server(service.handle_client, "127.0.0.1", 0)
+    try:
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        for request in requests:
+            writer.write(request if isinstance(request, bytes) else json.dumps(request).encode() + b"\n")
+        writer.write_eof()
+        responses = {}
+        while line := await asyncio.wait_for(reader.readline(), 5):
+            response = json.loads(line)
+            responses[response["id"]] = response
+        writer.close()
+        return responses
+    finally:
+        server.close()
+        for runner in runners:
+            runner.cancel()
+
+
+def counting(handler, sizes):
+    """Wraps a batch handler so the size of every batch is recorded."""
+    def handle(values):
+        sizes.append(len(values))
+        return handler(values)
+    return handle
+
+
+def test_requests_are_batched_and_answered():
+    service = normalize_service.NormalizeService(batch_size=8, max_wait=0.05)
+    sizes = []
+    service.batchers["phone"].handler = counting(service.batchers["phone"].handler, sizes)
+    requests = [dict(PHONE, id=i) if i % 2 else dict(ADDRESS, id=i) for i in range(40)]
+    responses = asyncio.run(round_trip(service, requests + [b"not json\n"]))
+
+    assert len(responses) == 41
+    assert responses[1]["result"]["number"] == "8003569377"
+    assert responses[0]["result"]["zip"] == "20707"
+    assert responses[None]["ok"] is False
+    assert sum(sizes) == 20 and max(sizes) <= 8 and len(sizes) < 20
+
+
+def test_in_flight_requests_are_capped():
+    service = normalize_service.NormalizeService(batch_size=64, max_wait=0.01, max_in_flight=3)
+    sizes = []
+    service.batchers["phone"].handler = counting(service.batchers["phone"].handler, sizes)
+    responses = asyncio.run(round_trip(service, [dict(PHONE, id=i) for i in range(30)]))
+
+    assert sorted(responses) == list(range(30))
+    # reading waits while three requests are being answered
+    assert sum(sizes) == 30 and max(sizes) <= 3
+
+
+def test_failing_handler_gets_an_error_response():
+    service = normalize_service.NormalizeService(max_wait=0.001)
+
+    def fail(values):
+        raise RuntimeError("handler broke")
+    service.batchers["phone"].handler = fail
+    responses = asyncio.run(round_trip(service, [dict(PHONE, id=1), dict(ADDRESS, id=2)]))
+
+    assert responses[1]["ok"] is False and "handler broke" in responses[1]["error"]
+    assert responses[2]["ok"] is True
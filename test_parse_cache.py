@@ -0,0 +1,60 @@
+"""Checks that ParseCache keeps its results through eviction and reopening."""
+from parse_cache import ParseCache
+
+
+def lines(start, stop):
+    return [b"line %d\n" % i for i in range(start, stop)]
+
+
+def parse(line):
+    return line.decode().upper()
+
+
+def open_cache(directory, max_entries = 30):
+    return ParseCache(str(directory), "test", max_entries = max_entries, batch_size = 10)
+
+
+def test_results_survive_reopening(tmp_path):
+    cache = open_cache(tmp_path)
+    first = list(cache.results(lines(0, 25), parse))
+    cache.close()
+    cache = open_cache(tmp_path)
+    assert list(cache.results(lines(0, 25), lambda line: "parsed again")) == first
+    assert (cache.hits, cache.misses, len(cache)) == (25, 0, 25)
+    cache.close()
+
+
+def test_cache_stays_within_cap(tmp_path):
+    cache = open_cache(tmp_path)
+    list(cache.results(lines(0, 50), parse))
+    # pages of ten are evicted oldest first as soon as the cap is passed
+    assert len(cache) == 30
+    assert list(cache.results(lines(20, 50), lambda line: "parsed again")) == \
+        [(line.rstrip(b"\n"), parse(line.rstrip(b"\n"))) for line in lines(20, 50)]
+    assert cache.misses == 50
+    assert cache.get_many([b"line 0"]) == [None]
+    cache.close()
+
+
+def test_pages_used_last_are_kept(tmp_path):
+    cache = open_cache(tmp_path)
+    list(cache.results(lines(0, 30), parse))
+    cache.close()
+    cache = open_cache(tmp_path)
+    list(cache.results(lines(0, 10), parse))
+    cache.close()
+    # reopening with a smaller cap evicts the pages the last run did not use
+    cache = open_cache(tmp_path, max_entries = 10)
+    assert len(cache) == 10
+    assert cache.get_many([line.rstrip(b"\n") for line in lines(0, 10)]) == \
+        [parse(line.rstrip(b"\n")) for line in lines(0, 10)]
+    assert cache.get_many([b"line 10", b"line 29"]) == [None, None]
+    cache.close()
+
+
+def test_result_with_separator_is_not_cached(tmp_path):
+    cache = open_cache(tmp_path)
+    assert list(cache.results([b"a\n", b"b"], lambda line: line.decode() + "\0")) == \
+        [(b"a", "a\0"), (b"b", "b\0")]
+    assert len(cache) == 0
+    cache.close()
@@ -0,0 +1,124 @@
+"""Checks PhoneBook against a plain list of the same (name, number) entries."""
+import pytest
+
+import phone_numbers
+
+ENTRIES = [
+    ("Ann", "(301) 555-0100"),
+    ("Bob", "1-800-FLOWERS"),
+    ("Cy", "301.555.0100"),
+    ("Ann", "301 555 0100"),
+    ("Di", "(240) 555-0123"),
+    ("Bob", "800 356 9377"),
+    ("Eve", "(202) 555-0199"),
+    ("Fay", "(٣٠١) ٥٥٥-٠١٩٩"),
+]
+
+
+def numbered(entries):
+    return [(name, int(phone_numbers.PhoneNumber(number))) for name, number in entries]
+
+
+def book_entries(book):
+    return [(name, int(number)) for name, number in book]
+
+
+def test_sort_is_stable_by_number():
+    book = phone_numbers.PhoneBook((name, phone_numbers.PhoneNumber(number)) for name, number in ENTRIES)
+    book.sort()
+    assert book_entries(book) == sorted(numbered(ENTRIES), key = lambda entry: entry[1])
+
+
+def test_dedup_keeps_first_of_each_entry():
+    book = phone_numbers.PhoneBook(numbered(ENTRIES))
+    book.dedup()
+    assert book_entries(book) == list(dict.fromkeys(numbered(ENTRIES)))
+
+
+def test_names_for_and_membership():
+    expected = numbered(ENTRIES)
+    book = phone_numbers.PhoneBook(expected)
+    for sort in (False, True):
+        if sort:
+            book.sort()
+            expected = sorted(expected, key = lambda entry: entry[1])
+        for _, number in expected:
+            assert book.names_for(number) == [name for name, other in expected if other == number]
+            assert number in book
+        assert book.names_for(2025550100) == []
+    assert "1-800-FLOWERS" in book
+    assert "202-555-0100" not in book
+    assert "not a number" not in book
+
+
+def test_normalize_numbers_matches_phone_number():
+    raws = [number for _, number in ENTRIES] + [
+        "", "3015550100", "13015550100", "0015550100", "3115550100", "3015115100",
+        "1-800-flowers", "(301) 555-01", "301\x80555\x800100", "x" * 40, 3015550100,
+        "\t3 0 1 5 5 5 0 1 0 0\x1f", "٣٠١", "é 301 555 0100", "301-555-0100 ext 42",
+    ]
+    expected = []
+    for raw in raws:
+        try:
+            expected.append(int(phone_numbers.PhoneNumber(str(raw))))
+        except ValueError:
+            expected.append(0)
+    numbers, valid = phone_numbers.normalize_numbers(raws)
+    assert list(numbers) == expected
+    assert list(valid) == [int(number != 0) for number in expected]
+    numbers, valid = phone_numbers.normalize_numbers([])
+    assert (len(numbers), len(valid)) == (0, 0)
+
+
+def test_non_ascii_digits_are_read_by_value():
+    numbers, valid = phone_numbers.normalize_numbers(["(٣٠١) ٥٥٥-٠١٩٩", "٣٠١"])
+    assert (list(numbers), list(valid)) == ([3015550199, 0], [1, 0])
+    book = phone_numbers.PhoneBook([("Fay", phone_numbers.PhoneNumber("(٣٠١) ٥٥٥-٠١٩٩"))])
+    assert str(book[0][1]) == "(301) 555-0199"
+
+
+@pytest.mark.parametrize("max_memory", [1, 400, 1 << 20])
+@pytest.mark.parametrize("dedup", [False, True])
+def test_external_sort_matches_in_memory(tmp_path, capsys, max_memory, dedup):
+    path = tmp_path / "phones.txt"
+    lines = [f"{name}\t{number}" for name, number in ENTRIES * 3 + [("Gus", "555-0100")]]
+    path.write_text("\n".join(lines[::-1] + lines) + "\n", encoding = "utf-8")
+    phone_numbers.main(str(path), dedup = dedup)
+    in_memory = capsys.readouterr().out
+    phone_numbers.main(str(path), dedup = dedup, max_memory = max_memory)
+    assert capsys.readouterr().out == in_memory
+    assert len(in_memory.splitlines()) == (6 if dedup else 48)
+
+
+def test_index_matches_brute_force():
+    entries = numbered(ENTRIES) + [("Hal", 2025550100), ("Ivy", 3015559999), ("Jo", 3019990000),
+                                   ("Kim", 9999999999), ("Lu", 2025550100)]
+    index = phone_numbers.PhoneIndex(phone_numbers.PhoneBook(entries))
+    # sorted is stable, so equal numbers stay in input order like the book
+    expected = sorted(entries, key = lambda entry: entry[1])
+
+    def matching(keep):
+        return [(name, number) for name, number in expected if keep(number)]
+
+    for low, high in [(0, 9999999999), (2025550100, 3015550100), (3015550101, 3015550198),
+                      (3015550199, 3015550199), (9000000000, 2000000000)]:
+        assert book_entries(index.range(low, high)) == matching(lambda n: low <= n <= high)
+    for prefix in ["2", "202", "301", "(301) 555", "301-555-01", "3015550199", "800", "999", "4", 301]:
+        digits = "".join(c for c in str(prefix) if c.isdigit())
+        keep = lambda n: f"{n:010d}".startswith(digits)
+        assert book_entries(index.prefix(prefix)) == matching(keep)
+        assert index.count(prefix) == len(matching(keep))
+    for length in (1, 3, 6, 10):
+        counts = {}
+        for _, number in expected:
+            key = f"{number:010d}"[:length]
+            counts[key] = counts.get(key, 0) + 1
+        assert index.counts_by_prefix(length) == counts
+        assert list(index.counts_by_prefix(length)) == sorted(counts)
+    for number in {number for _, number in entries} | {2405550000}:
+        assert index.names_for(number) == [name for name, other in expected if other == number]
+    assert index.names_for("202-555-0100") == ["Hal", "Lu"]
+    assert index.names_for("not a number") == []
+    for prefix in ["", "12345678901", "area"]:
+        with pytest.raises(ValueError):
+            index.count(prefix)
@@ -0,0 +1,137 @@
+"""Checks that the memory-mapped and cached readers give exactly what the text readers give."""
+import pytest
+
+import parse_addresses
+from parse_cache import ParseCache
+import phone_numbers
+
+ADDRESS_LINES = [
+    "101 Main St, Laurel MD 20707",
+    "12 B Elm Ave, College Park MD 20740",
+    "1\x1f2 Foo St, Bar AB 12345",
+    "not an address",
+    "7 Oak Rd, Silver Spring MD 20901",
+]
+PHONE_LINES = [
+    "Ann\t(301) 555-0100",
+    "Bob\t1-800-FLOWERS",
+    "\x1fCy\t301.555.0199",
+    "Di\t011-555-0100",
+    "Émile\t240 555 0123",
+    "Fay\t(٣٠١) ٥٥٥-٠١٩٩",
+]
+
+# each file is written as bytes: with LF or CRLF line ends, with or without
+# a newline at the end, and empty
+ENDINGS = [("\n", True), ("\n", False), ("\r\n", True), ("\r\n", False)]
+
+
+def write_lines(tmp_path, lines, newline, trailing):
+    text = newline.join(lines) + (newline if trailing and lines else "")
+    path = tmp_path / "input.txt"
+    path.write_bytes(text.encode("UTF-8"))
+    return str(path)
+
+
+def address_fields(addresses):
+    return [vars(address) for address in addresses]
+
+
+@pytest.mark.parametrize("newline, trailing", ENDINGS)
+def test_addresses_mmap_matches_text(tmp_path, newline, trailing):
+    path = write_lines(tmp_path, ADDRESS_LINES, newline, trailing)
+    text_rejects = []
+    mmap_rejects = []
+    text = address_fields(parse_addresses.iter_addresses(path, text_rejects))
+    mapped = address_fields(parse_addresses.iter_addresses(path, mmap_rejects, use_mmap = True))
+    assert mapped == text
+    assert mmap_rejects == text_rejects
+    assert text[2]["house_number"] == "1"
+
+
+def test_addresses_ascii_block_matches_text(tmp_path):
+    # a block of ASCII lines that all match would take the one-findall path,
+    # where a bytes \s does not match \x1f
+    lines = [line for line in ADDRESS_LINES if line.isascii() and line != "not an address"]
+    path = write_lines(tmp_path, lines, "\n", True)
+    text = address_fields(parse_addresses.read_addresses(path))
+    assert address_fields(parse_addresses.read_addresses(path, use_mmap = True)) == text
+    assert text[1]["house_number"] == "1"
+
+
+def test_addresses_empty_file(tmp_path):
+    path = write_lines(tmp_path, [], "\n", False)
+    assert parse_addresses.read_addresses(path) == []
+    assert parse_addresses.read_addresses(path, use_mmap = True) == []
+
+
+@pytest.mark.parametrize("newline, trailing", ENDINGS)
+def test_phones_mmap_matches_text(tmp_path, newline, trailing):
+    path = write_lines(tmp_path, PHONE_LINES, newline, trailing)
+    text = [(name, str(number)) for name, number in phone_numbers.read_numbers(path)]
+    mapped = [(name, str(number)) for name, number in phone_numbers.read_numbers(path, use_mmap = True)]
+    assert mapped == text
+    assert ("Cy", "(301) 555-0199") in text
+
+
+def test_phones_ascii_block_matches_text(tmp_path):
+    lines = [line for line in PHONE_LINES if line.isascii()]
+    path = write_lines(tmp_path, lines, "\n", True)
+    assert ([(name, str(number)) for name, number in phone_numbers.read_numbers(path, use_mmap = True)]
+            == [(name, str(number)) for name, number in phone_numbers.read_numbers(path)])
+
+
+def test_phones_empty_file(tmp_path):
+    path = write_lines(tmp_path, [], "\n", False)
+    assert phone_numbers.read_numbers(path) == []
+    assert phone_numbers.read_numbers(path, use_mmap = True) == []
+
+
+def read_cached(tmp_path, read, namespace):
+    """Runs read twice, each time with the cache opened again, and returns each result with its hits."""
+    results = []
+    for _ in range(2):
+        cache = ParseCache(str(tmp_path / "cache"), namespace, batch_size = 2)
+        results.append((read(cache), cache.hits))
+        cache.close()
+    return results
+
+
+@pytest.mark.parametrize("lines, newline, trailing",
+                         [(ADDRESS_LINES, *ending) for ending in ENDINGS] + [([], "\n", False)])
+def test_addresses_cache_matches_text(tmp_path, lines, newline, trailing):
+    path = write_lines(tmp_path, lines, newline, trailing)
+    rejects = []
+    text = address_fields(parse_addresses.iter_addresses(path, rejects))
+
+    def read(cache):
+        cached_rejects = []
+        addresses = address_fields(parse_addresses.iter_addresses(path, cached_rejects, cache = cache))
+        return addresses, cached_rejects
+    # the second read finds every line in the cache
+    assert read_cached(tmp_path, read, "address") == [((text, rejects), 0),
+                                                     ((text, rejects), len(lines))]
+
+
+@pytest.mark.parametrize("lines, newline, trailing",
+                         [(PHONE_LINES, *ending) for ending in ENDINGS] + [([], "\n", False)])
+def test_phones_cache_matches_text(tmp_path, lines, newline, trailing):
+    path = write_lines(tmp_path, lines, newline, trailing)
+    text = [(name, str(number)) for name, number in phone_numbers.read_numbers(path)]
+    book = [(name, str(number)) for name, number in phone_numbers.PhoneBook.from_file(path)]
+
+    def read(cache):
+        return [(name, str(number)) for name, number in phone_numbers.read_numbers(path, cache = cache)]
+
+    def read_book(cache):
+        return [(name, str(number)) for name, number in phone_numbers.PhoneBook.from_file(path, cache)]
+    assert read_cached(tmp_path, read, "phone") == [(text, 0), (text, len(lines))]
+    assert read_cached(tmp_path, read_book, "phone") == [(book, len(lines))] * 2
+
+
+@pytest.mark.parametrize("newline, trailing", ENDINGS)
+def test_phone_book_mmap_matches_text(tmp_path, newline, trailing):
+    path = write_lines(tmp_path, PHONE_LINES + ["Bob\t1-800-FLOWERS"], newline, trailing)
+    text = phone_numbers.PhoneBook.from_file(path)
+    mapped = phone_numbers.PhoneBook.from_file(path, use_mmap = True)
+    assert (mapped.names, mapped.numbers) == (text.names, text.numbers)